@@ -7,46 +7,66 @@ continues to work without changes.
 """
 
 from pipeline.sitemap import (
+    SITEMAP_NS_URI,
     SITEMAP_NS,
     HEADERS,
+    SitemapURL,
+    fetch_xml_bytes,
     fetch_xml,
     is_sitemap_index,
+    iter_urls,
     parse_sitemap,
 )
 
-from pipeline.normalize import normalize_url
+from pipeline.normalize import normalize_url, normalize_urls
 
-from pipeline.hashing import compute_hash
+from pipeline.hashing import compute_hash, url_fingerprint
 
 from pipeline.throttle import (
+    ThrottleConfig,
+    CONFIG,
     FETCH_BATCH_SIZE,
     MAX_WORKERS,
     REQUEST_TIMEOUT,
     MAX_RETRIES,
     BACKOFF_BASE,
+    BACKOFF_CAP,
     THROTTLE_DELAY,
     MAX_CONTENT_SIZE,
+    MAX_SITEMAP_SIZE,
+    FETCH_CHUNK_SIZE,
     MAX_CONSECUTIVE_FAILURES,
+    HOST_RATE_PER_SEC,
     TRANSIENT_STATUS_CODES,
     FETCH_HEADERS,
+    compute_backoff,
 )
 
-from pipeline.ingest import fetch_document
+from pipeline.ratelimit import HostRateLimiter, parse_retry_after
+
+from pipeline.fetch_cache import ResponseCache
+
+from pipeline.ingest import fetch_document, fetch_many
 
 from pipeline.db import (
     STAGING_TABLE,
+    STAGING_AGG_TABLE,
     MASTER_TABLE,
     CONTENT_TABLE,
     METRICS_TABLE,
     ALERTS_TABLE,
+    BULK_INSERT_THRESHOLD,
     create_staging_table,
     create_master_table,
+    migrate_master_sources,
     create_content_table,
     create_metrics_table,
     create_alerts_table,
     save_metrics,
     save_alerts,
+    save_alerts_bulk,
     get_historical_avg_duration,
+    fetch_observability_snapshot,
 )
 
 from pipeline.consolidate import merge_staging_to_master
@@ -61,6 +81,7 @@ from pipeline.observability import (
     start_pipeline_run,
     finish_pipeline_run,
     evaluate_alerts,
+    evaluate_alerts_batch,
     evaluate_staleness_alert,
     _make_alert,
 )
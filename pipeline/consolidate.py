@@ -2,34 +2,32 @@
 pipeline.consolidate — MERGE staging → master (idempotent upsert).
 """
 
-from pipeline.db import STAGING_TABLE, MASTER_TABLE
+from pipeline.db import STAGING_TABLE, STAGING_AGG_TABLE, MASTER_TABLE
 
-
-def merge_staging_to_master(cursor):
-    """MERGE staging → master (idempotent upsert)."""
-    merge_sql = f"""
-    MERGE INTO {MASTER_TABLE} AS tgt
-    USING (
+# One row per LOC: latest LASTMOD and the distinct sitemaps it appeared in
+_STAGING_AGG_SELECT = f"""
         SELECT
             LOC,
             MAX(LASTMOD) AS LASTMOD,
-            LISTAGG(DISTINCT SOURCE_SITEMAP, ',') WITHIN GROUP (ORDER BY SOURCE_SITEMAP) AS SOURCES
+            ARRAY_AGG(DISTINCT SOURCE_SITEMAP) WITHIN GROUP (ORDER BY SOURCE_SITEMAP) AS SOURCES
         FROM {STAGING_TABLE}
         GROUP BY LOC
-    ) AS src
+"""
+
+
+def _merge_sql(source: str) -> str:
+    """Return the MERGE statement reading staged rows from ``source``."""
+    return f"""
+    MERGE INTO {MASTER_TABLE} AS tgt
+    USING {source} AS src
     ON tgt.LOC = src.LOC
 
     WHEN MATCHED THEN UPDATE SET
         tgt.LAST_SEEN_AT = CURRENT_TIMESTAMP(),
         tgt.LASTMOD      = COALESCE(src.LASTMOD, tgt.LASTMOD),
-        tgt.SOURCES      = (
-            SELECT LISTAGG(DISTINCT val, ',') WITHIN GROUP (ORDER BY val)
-            FROM (
-                SELECT value AS val FROM TABLE(SPLIT_TO_TABLE(tgt.SOURCES, ','))
-                UNION
-                SELECT value AS val FROM TABLE(SPLIT_TO_TABLE(src.SOURCES, ','))
-            )
-        )
+        tgt.SOURCES      = ARRAY_SORT(ARRAY_DISTINCT(ARRAY_CAT(
+            COALESCE(tgt.SOURCES, ARRAY_CONSTRUCT()), src.SOURCES
+        )))
 
     WHEN NOT MATCHED THEN INSERT (
         LOC, LASTMOD, SOURCES, FIRST_SEEN_AT, LAST_SEEN_AT
@@ -37,5 +35,40 @@ def merge_staging_to_master(cursor):
         src.LOC, src.LASTMOD, src.SOURCES, CURRENT_TIMESTAMP(), CURRENT_TIMESTAMP()
     );
     """
-    cursor.execute(merge_sql)
-    return cursor.fetchone()
+
+
+_MERGE_SQL = _merge_sql(f"({_STAGING_AGG_SELECT})")
+
+_CREATE_STAGING_AGG_SQL = f"""
+    CREATE OR REPLACE TRANSIENT TABLE {STAGING_AGG_TABLE}
+    CLUSTER BY (LOC)
+    AS {_STAGING_AGG_SELECT}
+"""
+
+_MERGE_FROM_STAGING_AGG_SQL = _merge_sql(STAGING_AGG_TABLE)
+
+_DROP_STAGING_AGG_SQL = f"DROP TABLE IF EXISTS {STAGING_AGG_TABLE}"
+
+
+def merge_staging_to_master(cursor, materialize_staging: bool = False):
+    """
+    MERGE staging → master (idempotent upsert).
+
+    With ``materialize_staging=True`` the per-LOC aggregate is first written to
+    a transient table clustered on LOC (matching master) and merged from there,
+    which lets Snowflake prune micro-partitions on very large staging loads.
+    The transient table is dropped afterwards.
+
+    Master SOURCES must be an ARRAY; run ``migrate_master_sources`` once on
+    tables created before that change.
+    """
+    if not materialize_staging:
+        cursor.execute(_MERGE_SQL)
+        return cursor.fetchone()
+
+    cursor.execute(_CREATE_STAGING_AGG_SQL)
+    try:
+        cursor.execute(_MERGE_FROM_STAGING_AGG_SQL)
+        return cursor.fetchone()
+    finally:
+        cursor.execute(_DROP_STAGING_AGG_SQL)
@@ -2,14 +2,27 @@
 pipeline.db — Snowflake DDL helpers, metrics/alerts persistence, table names.
 """
 
+import csv
+import os
+import tempfile
+import uuid
 from typing import Optional
 
 STAGING_TABLE = "CANDIDATE_SSP_SITEMAP_STAGING"
+STAGING_AGG_TABLE = "CANDIDATE_SSP_SITEMAP_STAGING_AGG"
 MASTER_TABLE = "CANDIDATE_SSP_DOCS_MASTER"
 CONTENT_TABLE = "CANDIDATE_SSP_DOCUMENT_CONTENT"
 METRICS_TABLE = "PIPELINE_METRICS"
 ALERTS_TABLE = "ALERTS"
 
+# Above this many rows, stage-based loading (PUT + COPY INTO) beats multi-row INSERT
+BULK_INSERT_THRESHOLD = 100
+
+_ALERT_COLUMNS = (
+    "alert_id", "run_id", "created_at", "severity", "category",
+    "condition_name", "message", "metric_value", "threshold",
+)
+
 
 def create_staging_table(cursor):
     cursor.execute(f"""
@@ -28,13 +41,49 @@ def create_master_table(cursor):
     CREATE TABLE IF NOT EXISTS {MASTER_TABLE} (
         LOC            VARCHAR(2000) NOT NULL PRIMARY KEY,
         LASTMOD        VARCHAR(50),
-        SOURCES        VARCHAR(4000),
+        SOURCES        ARRAY,
         FIRST_SEEN_AT  TIMESTAMP_NTZ NOT NULL DEFAULT CURRENT_TIMESTAMP(),
         LAST_SEEN_AT   TIMESTAMP_NTZ NOT NULL DEFAULT CURRENT_TIMESTAMP()
     )
     """)
 
 
+_SOURCES_TYPE_SQL = """
+    SELECT DATA_TYPE
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_SCHEMA = CURRENT_SCHEMA()
+      AND TABLE_NAME = %s
+      AND COLUMN_NAME = 'SOURCES'
+"""
+
+# Pre-ARRAY deployments stored SOURCES as a comma-joined VARCHAR(4000)
+_MIGRATE_SOURCES_SQL = (
+    f"ALTER TABLE {MASTER_TABLE} ADD COLUMN SOURCES_ARR ARRAY",
+    f"""
+    UPDATE {MASTER_TABLE}
+    SET SOURCES_ARR = IFF(SOURCES IS NULL OR SOURCES = '', NULL, SPLIT(SOURCES, ','))
+    """,
+    f"ALTER TABLE {MASTER_TABLE} DROP COLUMN SOURCES",
+    f"ALTER TABLE {MASTER_TABLE} RENAME COLUMN SOURCES_ARR TO SOURCES",
+)
+
+
+def migrate_master_sources(cursor) -> bool:
+    """
+    One-time upgrade of an existing master table whose SOURCES column is
+    still TEXT: copy it into an ARRAY column (split on ",") and swap that in.
+    ``CREATE TABLE IF NOT EXISTS`` never alters an existing table, so run this
+    before the first ARRAY-based MERGE.  Returns True if a migration ran.
+    """
+    cursor.execute(_SOURCES_TYPE_SQL, (MASTER_TABLE,))
+    row = cursor.fetchone()
+    if not row or row[0] != "TEXT":
+        return False
+    for sql in _MIGRATE_SOURCES_SQL:
+        cursor.execute(sql)
+    return True
+
+
 def create_content_table(cursor):
     cursor.execute(f"""
     CREATE TABLE IF NOT EXISTS {CONTENT_TABLE} (
@@ -97,54 +146,119 @@ def create_alerts_table(cursor):
 
 
 
+_INSERT_METRICS_SQL = f"""
+    INSERT INTO {METRICS_TABLE} (
+        RUN_ID, RUN_START, RUN_END, DURATION_SECONDS, STAGE,
+        URLS_DISCOVERED, URLS_INSERTED, URLS_UPDATED,
+        FETCH_SUCCESS, FETCH_FAILED, FETCH_TIMEOUT, FETCH_SKIPPED,
+        FAILURE_RATE_PCT, AVG_RESPONSE_MS, STATUS, ERROR_MESSAGE
+    ) VALUES (
+        %(run_id)s, %(run_start)s, %(run_end)s, %(duration_seconds)s, %(stage)s,
+        %(urls_discovered)s, %(urls_inserted)s, %(urls_updated)s,
+        %(fetch_success)s, %(fetch_failed)s, %(fetch_timeout)s, %(fetch_skipped)s,
+        %(failure_rate_pct)s, %(avg_response_ms)s, %(status)s, %(error_message)s
+    )
+"""
+
+_INSERT_ALERT_SQL = f"""
+    INSERT INTO {ALERTS_TABLE} (
+        ALERT_ID, RUN_ID, CREATED_AT, SEVERITY, CATEGORY,
+        CONDITION_NAME, MESSAGE, METRIC_VALUE, THRESHOLD, ACKNOWLEDGED
+    ) VALUES (
+        %(alert_id)s, %(run_id)s, %(created_at)s, %(severity)s, %(category)s,
+        %(condition_name)s, %(message)s, %(metric_value)s, %(threshold)s, FALSE
+    )
+"""
+
+_HISTORICAL_AVG_DURATION_SQL = f"""
+    SELECT AVG(DURATION_SECONDS)
+    FROM (
+        SELECT DURATION_SECONDS
+        FROM {METRICS_TABLE}
+        WHERE STATUS = 'completed' AND DURATION_SECONDS IS NOT NULL
+        ORDER BY RUN_END DESC
+        LIMIT 10
+    )
+"""
+
+_OBSERVABILITY_SNAPSHOT_SQL = f"""
+    WITH completed AS (
+        SELECT RUN_END, DURATION_SECONDS
+        FROM {METRICS_TABLE}
+        WHERE STATUS = 'completed'
+    ),
+    recent AS (
+        SELECT DURATION_SECONDS
+        FROM completed
+        WHERE DURATION_SECONDS IS NOT NULL
+        ORDER BY RUN_END DESC
+        LIMIT 10
+    )
+    SELECT
+        (SELECT MAX(RUN_END) FROM completed)       AS LAST_RUN_END,
+        (SELECT AVG(DURATION_SECONDS) FROM recent) AS HIST_AVG_DURATION,
+        (SELECT COUNT(*) FROM recent)              AS HIST_SAMPLE_COUNT
+"""
+
+
 def save_metrics(cursor, metrics: dict):
     """INSERT a finalised metrics dict into PIPELINE_METRICS."""
-    cursor.execute(
-        f"""
-        INSERT INTO {METRICS_TABLE} (
-            RUN_ID, RUN_START, RUN_END, DURATION_SECONDS, STAGE,
-            URLS_DISCOVERED, URLS_INSERTED, URLS_UPDATED,
-            FETCH_SUCCESS, FETCH_FAILED, FETCH_TIMEOUT, FETCH_SKIPPED,
-            FAILURE_RATE_PCT, AVG_RESPONSE_MS, STATUS, ERROR_MESSAGE
-        ) VALUES (
-            %(run_id)s, %(run_start)s, %(run_end)s, %(duration_seconds)s, %(stage)s,
-            %(urls_discovered)s, %(urls_inserted)s, %(urls_updated)s,
-            %(fetch_success)s, %(fetch_failed)s, %(fetch_timeout)s, %(fetch_skipped)s,
-            %(failure_rate_pct)s, %(avg_response_ms)s, %(status)s, %(error_message)s
-        )
-        """,
-        metrics,
-    )
+    cursor.execute(_INSERT_METRICS_SQL, metrics)
 
 
 def save_alerts(cursor, alerts: list[dict]):
-    """Batch-INSERT alert dicts into ALERTS table."""
-    for alert in alerts:
-        cursor.execute(
-            f"""
-            INSERT INTO {ALERTS_TABLE} (
+    """Batch-INSERT alert dicts into ALERTS table in a single round trip."""
+    if not alerts:
+        return
+    if len(alerts) > BULK_INSERT_THRESHOLD:
+        save_alerts_bulk(cursor, alerts)
+        return
+    cursor.executemany(_INSERT_ALERT_SQL, alerts)
+
+
+def save_alerts_bulk(cursor, alerts: list[dict]):
+    """
+    Load alert dicts into ALERTS via the table stage: write one CSV file,
+    PUT it to ``@%ALERTS`` and COPY INTO the table (purging the staged file).
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = f"alerts_{uuid.uuid4().hex}.csv"
+        path = os.path.join(tmp_dir, file_name)
+        with open(path, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.writer(fh)
+            for alert in alerts:
+                writer.writerow([alert[col] for col in _ALERT_COLUMNS] + ["FALSE"])
+
+        cursor.execute(f"PUT 'file://{path}' @%{ALERTS_TABLE} AUTO_COMPRESS=TRUE")
+        cursor.execute(f"""
+            COPY INTO {ALERTS_TABLE} (
                 ALERT_ID, RUN_ID, CREATED_AT, SEVERITY, CATEGORY,
                 CONDITION_NAME, MESSAGE, METRIC_VALUE, THRESHOLD, ACKNOWLEDGED
-            ) VALUES (
-                %(alert_id)s, %(run_id)s, %(created_at)s, %(severity)s, %(category)s,
-                %(condition_name)s, %(message)s, %(metric_value)s, %(threshold)s, FALSE
             )
-            """,
-            alert,
-        )
+            FROM @%{ALERTS_TABLE}
+            FILES = ('{file_name}.gz')
+            FILE_FORMAT = (TYPE = CSV FIELD_OPTIONALLY_ENCLOSED_BY = '"')
+            PURGE = TRUE
+        """)
 
 
 def get_historical_avg_duration(cursor) -> Optional[float]:
     """Return average DURATION_SECONDS of the last 10 completed runs, or None."""
-    cursor.execute(f"""
-        SELECT AVG(DURATION_SECONDS)
-        FROM (
-            SELECT DURATION_SECONDS
-            FROM {METRICS_TABLE}
-            WHERE STATUS = 'completed' AND DURATION_SECONDS IS NOT NULL
-            ORDER BY RUN_END DESC
-            LIMIT 10
-        )
-    """)
+    cursor.execute(_HISTORICAL_AVG_DURATION_SQL)
     row = cursor.fetchone()
     return float(row[0]) if row and row[0] is not None else None
+
+
+def fetch_observability_snapshot(cursor) -> dict:
+    """
+    Fetch everything alert evaluation needs from PIPELINE_METRICS in one
+    round trip: last completed RUN_END and the average DURATION_SECONDS
+    (plus sample count) of the last 10 completed runs.
+    """
+    cursor.execute(_OBSERVABILITY_SNAPSHOT_SQL)
+    row = cursor.fetchone() or (None, None, 0)
+    return {
+        "last_run_end": row[0],
+        "hist_avg_duration": float(row[1]) if row[1] is not None else None,
+        "hist_sample_count": int(row[2] or 0),
+    }
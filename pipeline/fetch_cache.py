@@ -0,0 +1,83 @@
+"""
+pipeline.fetch_cache — Optional on-disk cache of fetched documents (sqlite3 + zlib).
+"""
+
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS responses (
+        url                TEXT PRIMARY KEY,
+        fetched_at         REAL NOT NULL,
+        http_status        INTEGER,
+        content_hash       TEXT,
+        content_size_bytes INTEGER,
+        body               BLOB NOT NULL
+    )
+"""
+
+
+class ResponseCache:
+    """
+    URL → successful ``fetch_document`` result, stored zlib-compressed in a
+    single SQLite file so repeat runs skip the network.  Entries older than
+    ``ttl`` seconds are treated as misses.
+
+    One connection is shared by every ``fetch_many`` worker behind a lock;
+    SQLite work is tiny next to the network round trip it replaces.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400.0):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(_SCHEMA)
+
+    def get(self, url: str) -> Optional[dict]:
+        """
+        Return the cached result for ``url`` or None.  Hits keep
+        ``fetch_status="success"`` and are marked ``from_cache=True``.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_at, http_status, content_hash, content_size_bytes, body "
+                "FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+        _, http_status, content_hash, size, body = row
+        return {
+            "content": zlib.decompress(body).decode("utf-8"),
+            "content_hash": content_hash,
+            "content_size_bytes": size,
+            "http_status": http_status,
+            "fetch_status": "success",
+            "retry_count": 0,
+            "from_cache": True,
+        }
+
+    def put(self, url: str, result: dict) -> None:
+        """Store a successful fetch result for ``url``, replacing any older entry."""
+        body = zlib.compress(result["content"].encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    time.time(),
+                    result["http_status"],
+                    result["content_hash"],
+                    result["content_size_bytes"],
+                    body,
+                ),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -5,6 +5,21 @@ pipeline.hashing — Content hashing for change detection.
 import hashlib
 
 
-def compute_hash(content: str) -> str:
-    """Compute SHA-256 hash of content for change detection."""
-    return hashlib.sha256(content.encode("utf-8", errors="replace")).hexdigest()
+def compute_hash(content: str | bytes) -> str:
+    """
+    Compute SHA-256 hash of content for change detection.
+    Bytes (or any buffer) are hashed as-is, skipping the encode copy.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8", errors="replace")
+    return hashlib.sha256(content).hexdigest()
+
+
+def url_fingerprint(url: str) -> int:
+    """
+    64-bit fingerprint of a URL for in-memory de-duplication sets.
+    Not for change detection: collisions are negligible at crawl scale but
+    the digest is not cryptographic.
+    """
+    digest = hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
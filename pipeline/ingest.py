@@ -2,36 +2,95 @@
 pipeline.ingest — Fetch document content (master → document_content).
 """
 
+import codecs
+import os
 import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from pipeline.hashing import compute_hash
+from pipeline.fetch_cache import ResponseCache
+from pipeline.hashing import compute_hash, url_fingerprint
+from pipeline.ratelimit import HostRateLimiter
 from pipeline.throttle import (
     BACKOFF_BASE,
+    FETCH_BATCH_SIZE,
+    FETCH_CHUNK_SIZE,
     FETCH_HEADERS,
+    HOST_RATE_PER_SEC,
     MAX_CONTENT_SIZE,
     MAX_RETRIES,
+    MAX_WORKERS,
     REQUEST_TIMEOUT,
     THROTTLE_DELAY,
     TRANSIENT_STATUS_CODES,
+    compute_backoff,
 )
 
+# Shared session: pooled keep-alive connections are reused across fetches
+# (and across fetch_many worker threads) instead of a fresh TCP+TLS
+# handshake per document.  Transport retries stay off: fetch_document owns
+# retry/backoff so attempts are counted in retry_count.
+_SESSION = requests.Session()
+_SESSION.headers.update(FETCH_HEADERS)
+_ADAPTER = HTTPAdapter(
+    pool_connections=MAX_WORKERS,
+    pool_maxsize=MAX_WORKERS * 2,
+    max_retries=0,
+)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+
+# Per-host token bucket shared by every fetch_many worker, retries included
+_LIMITER = HostRateLimiter(HOST_RATE_PER_SEC)
+
+# Opt-in on-disk cache of successful fetches (INGEST_CACHE=1); hits skip
+# the network, the host limiter and the politeness delay.
+_CACHE = (
+    ResponseCache(os.environ.get("INGEST_CACHE_PATH", "ingest_cache.sqlite"))
+    if os.environ.get("INGEST_CACHE") == "1"
+    else None
+)
+
+
+def _response_encoding(resp) -> str:
+    """The response's declared charset if Python knows it, else UTF-8."""
+    encoding = resp.encoding or "utf-8"
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        return "utf-8"
+
 
 def fetch_document(url: str) -> dict:
     """
     Fetch a single document with streaming, retries, and throttling.
+    With the response cache enabled, a fresh hit is returned as-is (still
+    ``fetch_status="success"``, plus ``from_cache=True``).
     """
+    if _CACHE is not None:
+        cached = _CACHE.get(url)
+        if cached is not None:
+            return cached
+
     last_exception = None
     http_status = None
+    delay = BACKOFF_BASE
+    host = urlsplit(url).netloc
 
     for attempt in range(MAX_RETRIES + 1):
         try:
             if attempt > 0:
-                wait = BACKOFF_BASE ** attempt
-                time.sleep(wait)
+                delay = compute_backoff(delay)
+                time.sleep(delay)
 
-            with requests.get(url, headers=FETCH_HEADERS, timeout=REQUEST_TIMEOUT, stream=True) as resp:
+            _LIMITER.acquire(host)
+            with _SESSION.get(url, timeout=REQUEST_TIMEOUT, stream=True) as resp:
+                _LIMITER.update_from_response(host, resp)
                 http_status = resp.status_code
 
                 if resp.status_code >= 400 and resp.status_code not in TRANSIENT_STATUS_CODES:
@@ -48,27 +107,32 @@ def fetch_document(url: str) -> dict:
                     last_exception = f"HTTP {resp.status_code}"
                     continue
 
-                chunks = []
-                total_size = 0
+                # Buffer raw bytes; decode once with the declared charset
+                encoding = _response_encoding(resp)
+                buf = bytearray()
                 truncated = False
-                for chunk in resp.iter_content(chunk_size=64 * 1024, decode_unicode=True):
-                    if chunk:
-                        total_size += len(chunk.encode("utf-8", errors="replace"))
-                        if total_size <= MAX_CONTENT_SIZE:
-                            chunks.append(chunk)
-                        else:
-                            truncated = True
-                            break
-
-                content = "".join(chunks)
+                for chunk in resp.iter_content(chunk_size=FETCH_CHUNK_SIZE, decode_unicode=False):
+                    if isinstance(chunk, str):
+                        # Some adapters/mocks hand back text; normalise to bytes
+                        chunk = chunk.encode(encoding, errors="replace")
+                    if len(buf) + len(chunk) > MAX_CONTENT_SIZE:
+                        truncated = True
+                        break
+                    buf += chunk
+
+                # A truncated body may end mid-character; drop the partial tail
+                decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+                content = decoder.decode(buf, final=not truncated)
                 if truncated:
                     content += f"\n\n[TRUNCATED at {MAX_CONTENT_SIZE / (1024*1024):.0f} MB]"
-                    total_size = len(content.encode("utf-8", errors="replace"))
 
-                content_hash = compute_hash(content)
+                # Hash/size the stored text, as compute_hash(content) would
+                encoded = content.encode("utf-8", errors="replace")
+                total_size = len(encoded)
+                content_hash = compute_hash(encoded)
                 time.sleep(THROTTLE_DELAY)
 
-                return {
+                result = {
                     "content": content,
                     "content_hash": content_hash,
                     "content_size_bytes": total_size,
@@ -76,6 +140,9 @@ def fetch_document(url: str) -> dict:
                     "fetch_status": "success",
                     "retry_count": attempt,
                 }
+                if _CACHE is not None:
+                    _CACHE.put(url, result)
+                return result
 
         except requests.exceptions.Timeout:
             last_exception = "timeout"
@@ -96,3 +163,41 @@ def fetch_document(url: str) -> dict:
         "fetch_status": "timeout" if is_timeout else "failed",
         "retry_count": MAX_RETRIES,
     }
+
+
+def fetch_many(
+    urls: Iterable[str],
+    max_workers: int = MAX_WORKERS,
+    max_in_flight: int = FETCH_BATCH_SIZE,
+) -> Iterator[tuple[str, dict]]:
+    """
+    Fetch documents concurrently on a thread pool.
+    Yields ``(url, result)`` pairs in completion order; repeated URLs are
+    fetched once.
+
+    At most ``max_in_flight`` fetches are queued at a time; ``urls`` is
+    consumed lazily as slots free up, so huge URL streams never become one
+    giant list of futures.
+    """
+    seen: set[int] = set()
+
+    def _unique(stream):
+        for url in stream:
+            fp = url_fingerprint(url)
+            if fp not in seen:
+                seen.add(fp)
+                yield url
+
+    url_iter = _unique(urls)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {
+            pool.submit(fetch_document, url): url
+            for url in islice(url_iter, max_in_flight)
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = pending.pop(future)
+                for next_url in islice(url_iter, 1):
+                    pending[pool.submit(fetch_document, next_url)] = next_url
+                yield url, future.result()
@@ -2,8 +2,31 @@
 pipeline.normalize — URL normalization utilities.
 """
 
+import re
+from functools import lru_cache
 from urllib.parse import urlparse, urlunparse, quote, unquote
 
+# URLs already in canonical form: lowercase http(s) scheme and host, no port or
+# userinfo, path of quote-safe segments (no "//", no trailing slash unless root),
+# optional non-empty query, no fragment.  These normalize to themselves.
+_CANONICAL_URL_RE = re.compile(
+    r"https?://[a-z0-9.-]+"
+    r"(?:/|(?:/[A-Za-z0-9:@!$&'()*+,=\-._~]+)+)?"
+    r"(?:\?[^#\s]+)?"
+)
+
+_MULTISLASH_RE = re.compile(r"/{2,}")
+
+# Paths made only of characters ``quote`` leaves alone (and no "%" escapes)
+# are unchanged by the decode/re-encode round trip below.
+_SAFE_PATH_RE = re.compile(r"[A-Za-z0-9/:@!$&'()*+,;=\-._~]*")
+
+
+@lru_cache(maxsize=16384)
+def _cached_urlparse(url: str):
+    """``urlparse`` memoized on the URL; results are immutable namedtuples."""
+    return urlparse(url)
+
 
 def normalize_url(url: str) -> str:
     """
@@ -19,7 +42,11 @@ def normalize_url(url: str) -> str:
     if not url:
         return url
 
-    parsed = urlparse(url)
+    # Fast path: a single C-level regex match skips parsing entirely
+    if _CANONICAL_URL_RE.fullmatch(url):
+        return url
+
+    parsed = _cached_urlparse(url)
 
     scheme = parsed.scheme.lower()
     host = parsed.hostname.lower() if parsed.hostname else ""
@@ -31,13 +58,21 @@ def normalize_url(url: str) -> str:
     netloc = host if port is None else f"{host}:{port}"
 
     # Collapse duplicate slashes and remove trailing slash (keep root "/")
-    path = parsed.path
-    while "//" in path:
-        path = path.replace("//", "/")
+    path = _MULTISLASH_RE.sub("/", parsed.path)
     if path != "/" and path.endswith("/"):
         path = path.rstrip("/")
 
     # Re-encode path for consistency (decode then re-encode)
-    path = quote(unquote(path), safe="/:@!$&'()*+,;=-._~")
+    if not _SAFE_PATH_RE.fullmatch(path):
+        path = quote(unquote(path), safe="/:@!$&'()*+,;=-._~")
 
     return urlunparse((scheme, netloc, path, parsed.params, parsed.query, ""))
+
+
+def normalize_urls(urls: list[str]) -> list[str]:
+    """
+    Normalize a batch of URLs, preserving order.  Each distinct input is
+    normalized once and repeats reuse the result.
+    """
+    normalized = {url: normalize_url(url) for url in dict.fromkeys(urls)}
+    return [normalized[url] for url in urls]
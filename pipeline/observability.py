@@ -12,10 +12,14 @@ EMPTY_RESULT_MIN_ROWS    (1)   — Zero rows always suspicious.
 PERF_DEGRADATION_FACTOR (2.0)  — 2× filters noise while catching real slowdowns.
 """
 
+import os
 import uuid
 from datetime import datetime, timezone
 from typing import Optional
 
+import numpy as np
+import pandas as pd
+
 from pipeline.db import METRICS_TABLE
 
 FAILURE_RATE_WARNING = 10.0
@@ -25,6 +29,12 @@ STALENESS_CRITICAL_HOURS = 72
 EMPTY_RESULT_MIN_ROWS = 1
 PERF_DEGRADATION_FACTOR = 2.0
 
+_LAST_COMPLETED_RUN_SQL = f"""
+    SELECT MAX(RUN_END) AS LAST_RUN
+    FROM {METRICS_TABLE}
+    WHERE STATUS = 'completed'
+"""
+
 
 
 def start_pipeline_run(stage: str) -> dict:
@@ -75,12 +85,25 @@ def finish_pipeline_run(metrics: dict) -> dict:
 
 
 
-def _make_alert(run_id, severity, category, condition, message, metric_value, threshold):
-    """Build a single alert dict."""
+def _new_alert_ids(n: int) -> list[str]:
+    """Generate ``n`` random (version 4) UUID strings from a single urandom read."""
+    buf = os.urandom(16 * n)
+    return [str(uuid.UUID(bytes=buf[i:i + 16], version=4)) for i in range(0, 16 * n, 16)]
+
+
+def _make_alert(
+    run_id, severity, category, condition, message, metric_value, threshold,
+    created_at: Optional[datetime] = None,
+    alert_id: Optional[str] = None,
+):
+    """
+    Build a single alert dict.  Pass ``created_at`` / ``alert_id`` to share one
+    timestamp and pre-allocated ids across a batch.
+    """
     return {
-        "alert_id": str(uuid.uuid4()),
+        "alert_id": alert_id or str(uuid.uuid4()),
         "run_id": run_id,
-        "created_at": datetime.now(timezone.utc),
+        "created_at": created_at or datetime.now(timezone.utc),
         "severity": severity,
         "category": category,
         "condition_name": condition,
@@ -90,78 +113,167 @@ def _make_alert(run_id, severity, category, condition, message, metric_value, th
     }
 
 
-def evaluate_alerts(metrics: dict, historical_avg_duration: Optional[float] = None) -> list[dict]:
+def _failure_rate_alert(
+    run_id, failure_rate: float, critical: bool, created_at: datetime,
+    alert_id: Optional[str] = None,
+) -> dict:
+    """Build the failure-rate alert at CRITICAL or WARNING severity."""
+    if critical:
+        return _make_alert(
+            run_id, "CRITICAL", "failure_rate", "failure_rate_critical",
+            f"Failure rate {failure_rate:.1f}% exceeds critical threshold "
+            f"({FAILURE_RATE_CRITICAL}%)",
+            failure_rate, FAILURE_RATE_CRITICAL, created_at, alert_id,
+        )
+    return _make_alert(
+        run_id, "WARNING", "failure_rate", "failure_rate_warning",
+        f"Failure rate {failure_rate:.1f}% exceeds warning threshold "
+        f"({FAILURE_RATE_WARNING}%)",
+        failure_rate, FAILURE_RATE_WARNING, created_at, alert_id,
+    )
+
+
+def _empty_result_alert(
+    run_id, total_rows: int, created_at: datetime, alert_id: Optional[str] = None,
+) -> dict:
+    """Build the empty-result-set alert."""
+    return _make_alert(
+        run_id, "CRITICAL", "empty_results", "empty_result_set",
+        f"Pipeline produced {total_rows} rows (minimum expected: "
+        f"{EMPTY_RESULT_MIN_ROWS})",
+        float(total_rows), float(EMPTY_RESULT_MIN_ROWS), created_at, alert_id,
+    )
+
+
+def _performance_alert(
+    run_id, duration: float, historical_avg_duration: float, created_at: datetime,
+    alert_id: Optional[str] = None,
+) -> dict:
+    """Build the performance-degradation alert."""
+    ratio = duration / historical_avg_duration
+    return _make_alert(
+        run_id, "WARNING", "performance", "performance_degradation",
+        f"Run took {duration:.1f}s — {ratio:.1f}× the historical "
+        f"average ({historical_avg_duration:.1f}s)",
+        duration, historical_avg_duration * PERF_DEGRADATION_FACTOR, created_at, alert_id,
+    )
+
+
+def evaluate_alerts(
+    metrics: dict,
+    historical_avg_duration: Optional[float] = None,
+    snapshot: Optional[dict] = None,
+) -> list[dict]:
     """
     Evaluate alert conditions against a finished metrics dict.
     Returns zero or more alert dicts.
+
+    ``snapshot`` (from ``db.fetch_observability_snapshot``) supplies the
+    historical average when ``historical_avg_duration`` is not given.
     """
+    if historical_avg_duration is None and snapshot is not None:
+        historical_avg_duration = snapshot["hist_avg_duration"]
+
+    now = datetime.now(timezone.utc)
     alerts: list[dict] = []
     run_id = metrics["run_id"]
     failure_rate = metrics.get("failure_rate_pct", 0.0) or 0.0
 
     # 1. Anomalous failure rate
-    if failure_rate >= FAILURE_RATE_CRITICAL:
-        alerts.append(_make_alert(
-            run_id, "CRITICAL", "failure_rate", "failure_rate_critical",
-            f"Failure rate {failure_rate:.1f}% exceeds critical threshold "
-            f"({FAILURE_RATE_CRITICAL}%)",
-            failure_rate, FAILURE_RATE_CRITICAL,
-        ))
-    elif failure_rate >= FAILURE_RATE_WARNING:
-        alerts.append(_make_alert(
-            run_id, "WARNING", "failure_rate", "failure_rate_warning",
-            f"Failure rate {failure_rate:.1f}% exceeds warning threshold "
-            f"({FAILURE_RATE_WARNING}%)",
-            failure_rate, FAILURE_RATE_WARNING,
+    if failure_rate >= FAILURE_RATE_WARNING:
+        alerts.append(_failure_rate_alert(
+            run_id, failure_rate, failure_rate >= FAILURE_RATE_CRITICAL, now,
         ))
 
     # 2. Empty result set
     total_rows = metrics["urls_inserted"] + metrics["urls_updated"]
     if total_rows < EMPTY_RESULT_MIN_ROWS:
-        alerts.append(_make_alert(
-            run_id, "CRITICAL", "empty_results", "empty_result_set",
-            f"Pipeline produced {total_rows} rows (minimum expected: "
-            f"{EMPTY_RESULT_MIN_ROWS})",
-            float(total_rows), float(EMPTY_RESULT_MIN_ROWS),
-        ))
+        alerts.append(_empty_result_alert(run_id, total_rows, now))
 
     # 3. Performance degradation
     duration = metrics.get("duration_seconds")
     if duration is not None and historical_avg_duration is not None and historical_avg_duration > 0:
-        ratio = duration / historical_avg_duration
-        if ratio >= PERF_DEGRADATION_FACTOR:
-            alerts.append(_make_alert(
-                run_id, "WARNING", "performance", "performance_degradation",
-                f"Run took {duration:.1f}s — {ratio:.1f}× the historical "
-                f"average ({historical_avg_duration:.1f}s)",
-                duration, historical_avg_duration * PERF_DEGRADATION_FACTOR,
-            ))
+        if duration / historical_avg_duration >= PERF_DEGRADATION_FACTOR:
+            alerts.append(_performance_alert(run_id, duration, historical_avg_duration, now))
+
+    return alerts
+
+
+def evaluate_alerts_batch(
+    metrics_df: pd.DataFrame,
+    historical_avg_duration: Optional[float] = None,
+) -> list[dict]:
+    """
+    Vectorised ``evaluate_alerts`` over many runs at once, e.g. to backfill
+    alert history from a PIPELINE_METRICS frame.  Column names may be the
+    metrics-dict keys or the upper-case Snowflake column names.
+
+    Threshold checks run as NumPy masks over whole columns; alert dicts are
+    built only for the flagged rows, grouped by category.
+    """
+    df = metrics_df.rename(columns=str.lower)
+    run_ids = df["run_id"].to_numpy()
+    failure_rate = df["failure_rate_pct"].fillna(0.0).to_numpy(dtype=float)
+    total_rows = (
+        df["urls_inserted"].fillna(0) + df["urls_updated"].fillna(0)
+    ).to_numpy(dtype=int)
+    duration = df["duration_seconds"].to_numpy(dtype=float, na_value=np.nan)
+
+    flagged = np.flatnonzero(failure_rate >= FAILURE_RATE_WARNING)
+    critical = failure_rate >= FAILURE_RATE_CRITICAL
+    empty = np.flatnonzero(total_rows < EMPTY_RESULT_MIN_ROWS)
+    degraded = np.array([], dtype=int)
+    if historical_avg_duration is not None and historical_avg_duration > 0:
+        # NaN durations compare False
+        degraded = np.flatnonzero(duration / historical_avg_duration >= PERF_DEGRADATION_FACTOR)
+
+    now = datetime.now(timezone.utc)
+    ids = iter(_new_alert_ids(len(flagged) + len(empty) + len(degraded)))
+    alerts: list[dict] = []
+
+    # 1. Anomalous failure rate
+    for i in flagged:
+        alerts.append(_failure_rate_alert(
+            run_ids[i], float(failure_rate[i]), bool(critical[i]), now, next(ids),
+        ))
+
+    # 2. Empty result set
+    for i in empty:
+        alerts.append(_empty_result_alert(run_ids[i], int(total_rows[i]), now, next(ids)))
+
+    # 3. Performance degradation
+    for i in degraded:
+        alerts.append(_performance_alert(
+            run_ids[i], float(duration[i]), historical_avg_duration, now, next(ids),
+        ))
 
     return alerts
 
 
-def evaluate_staleness_alert(cursor) -> list[dict]:
+def evaluate_staleness_alert(cursor, snapshot: Optional[dict] = None) -> list[dict]:
     """
     Check whether the most recent pipeline run is stale.
     Returns zero or more alerts.
+
+    When ``snapshot`` (from ``db.fetch_observability_snapshot``) is given its
+    ``last_run_end`` is used and ``cursor`` is not queried.
     """
-    cursor.execute(f"""
-        SELECT MAX(RUN_END) AS LAST_RUN
-        FROM {METRICS_TABLE}
-        WHERE STATUS = 'completed'
-    """)
-    row = cursor.fetchone()
-
-    if row is None or row[0] is None:
+    if snapshot is not None:
+        last_run = snapshot["last_run_end"]
+    else:
+        cursor.execute(_LAST_COMPLETED_RUN_SQL)
+        row = cursor.fetchone()
+        last_run = row[0] if row is not None else None
+
+    now = datetime.now(timezone.utc)
+
+    if last_run is None:
         return [_make_alert(
             None, "CRITICAL", "staleness", "no_completed_runs",
             "No completed pipeline runs found in PIPELINE_METRICS",
-            None, None,
+            None, None, now,
         )]
 
-    last_run = row[0]
-    now = datetime.now(timezone.utc)
-
     if hasattr(last_run, "tzinfo") and last_run.tzinfo is None:
         last_run = last_run.replace(tzinfo=timezone.utc)
 
@@ -173,14 +285,14 @@ def evaluate_staleness_alert(cursor) -> list[dict]:
             None, "CRITICAL", "staleness", "pipeline_stale_critical",
             f"Last successful run was {hours_since:.1f}h ago "
             f"(critical threshold: {STALENESS_CRITICAL_HOURS}h)",
-            hours_since, float(STALENESS_CRITICAL_HOURS),
+            hours_since, float(STALENESS_CRITICAL_HOURS), now,
         ))
     elif hours_since >= STALENESS_WARNING_HOURS:
         alerts.append(_make_alert(
             None, "WARNING", "staleness", "pipeline_stale_warning",
             f"Last successful run was {hours_since:.1f}h ago "
             f"(warning threshold: {STALENESS_WARNING_HOURS}h)",
-            hours_since, float(STALENESS_WARNING_HOURS),
+            hours_since, float(STALENESS_WARNING_HOURS), now,
         ))
 
     return alerts
@@ -0,0 +1,75 @@
+"""
+pipeline.ratelimit — Per-host token-bucket rate limiting shared across threads.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a ``Retry-After`` header into seconds to wait.
+    Accepts delta-seconds or an HTTP-date; returns None if absent/unparseable.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class HostRateLimiter:
+    """
+    Token bucket per host: up to ``rate_per_sec`` requests per second with
+    bursts of ``burst`` (defaults to one second's worth of tokens).
+
+    A host that answers with ``Retry-After`` is paused for that long via
+    ``update_from_response``; callers block in ``acquire`` until allowed.
+    """
+
+    def __init__(self, rate_per_sec: float, burst: Optional[float] = None):
+        if rate_per_sec <= 0:
+            raise ValueError("rate_per_sec must be positive")
+        self.rate = rate_per_sec
+        self.burst = burst if burst is not None else max(1.0, rate_per_sec)
+        self._buckets: dict[str, tuple[float, float]] = {}   # host -> (tokens, last refill)
+        self._blocked_until: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str) -> None:
+        """Block until a request to ``host`` is allowed, then consume a token."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                blocked = self._blocked_until.get(host, 0.0) - now
+                if blocked <= 0 and tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return
+                self._buckets[host] = (tokens, now)
+                wait = max(blocked, (1 - tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, host: str, seconds: float) -> None:
+        """Hold all requests to ``host`` for ``seconds`` from now."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._blocked_until.get(host, 0.0):
+                self._blocked_until[host] = until
+
+    def update_from_response(self, host: str, resp) -> None:
+        """Honour a ``Retry-After`` header on the response, if any."""
+        delay = parse_retry_after(resp.headers.get("Retry-After"))
+        if delay:
+            self.pause(host, delay)
@@ -5,8 +5,10 @@ pipeline.sheets_export — Export Task 4 query results to Google Sheets via the
 from __future__ import annotations
 
 import os
+from functools import lru_cache
 from typing import Optional
 
+import numpy as np
 import pandas as pd
 
 from google.oauth2.service_account import Credentials
@@ -27,6 +29,9 @@ QUERY_TITLES: dict[str, str] = {
     "4e": "4e – Stale Document Analysis",
 }
 
+# Worksheet order for the known queries, fixed at import time
+_QUERY_ORDER: tuple[str, ...] = tuple(sorted(QUERY_TITLES))
+
 
 
 def _get_credentials(credentials_path: Optional[str] = None) -> Credentials:
@@ -42,16 +47,54 @@ def _get_credentials(credentials_path: Optional[str] = None) -> Credentials:
             "Set credentials_path, GOOGLE_APPLICATION_CREDENTIALS, "
             "or place service_account.json in the working directory."
         )
+    return _load_creds(os.path.abspath(path))
+
+
+@lru_cache(maxsize=4)
+def _load_creds(path: str) -> Credentials:
+    """Parse a key file once per absolute path; repeat exports reuse it."""
     return Credentials.from_service_account_file(path, scopes=SCOPES)
 
 
+@lru_cache(maxsize=8)
+def _cached_build(api: str, version: str, credentials: Credentials):
+    """
+    Build an API client once per (api, version, credentials).  Credentials
+    hash by identity and ``_load_creds`` hands back the same object per key
+    file, so repeat exports skip discovery and client construction.
+    """
+    return build(api, version, credentials=credentials)
+
+
+def _column_to_strings(col: pd.Series) -> list[str]:
+    """
+    Stringify one column for the Sheets API, with NaN/None as ``""``.
+    Plain NumPy bool/int/float64 columns skip the object-dtype ``fillna`` and
+    go straight from ``tolist()`` through ``str``, blanking NaN positions found
+    by a vectorised mask; everything else (object, datetime, float32 whose
+    repr would change, extension dtypes) goes through pandas.
+    """
+    dtype = col.dtype
+    if isinstance(dtype, np.dtype) and (dtype.kind in "biu" or dtype == np.float64):
+        values = col.to_numpy()
+        out = list(map(str, values.tolist()))
+        if dtype.kind == "f":
+            for i in np.flatnonzero(np.isnan(values)):
+                out[i] = ""
+        return out
+    return col.fillna("").astype(str).tolist()
+
+
 def _df_to_sheet_values(df: pd.DataFrame) -> list[list]:
     """
     Convert a DataFrame to a list-of-lists suitable for the Sheets API
-    ``values.update`` call.  The first element is the header row.
+    ``values.batchUpdate`` call.  The first element is the header row.
     """
     header = list(df.columns)
-    rows = df.fillna("").astype(str).values.tolist()
+    # Cast column-by-column (each stays a typed 1-D array until tolist) and
+    # transpose at the end, instead of materialising a 2-D object frame.
+    columns = [_column_to_strings(col) for _, col in df.items()]
+    rows = [list(row) for row in zip(*columns)]
     return [header] + rows
 
 
@@ -94,11 +137,22 @@ def _build_autosize_request(sheet_id: int) -> dict:
 
 
 
+def _write_feather_cache(dataframes: dict[str, pd.DataFrame], cache_dir) -> None:
+    """Write each DataFrame to ``cache_dir/<qid>.feather``."""
+    os.makedirs(cache_dir, exist_ok=True)
+    for qid, df in dataframes.items():
+        # Feather only stores a default RangeIndex
+        df.reset_index(drop=True).to_feather(
+            os.path.join(cache_dir, f"{qid}.feather"), compression="zstd"
+        )
+
+
 def export_to_google_sheets(
     dataframes: dict[str, pd.DataFrame],
     spreadsheet_id: str,
     credentials_path: Optional[str] = None,
     share_with: Optional[str] = None,
+    cache_dir: Optional[str | os.PathLike] = None,
 ) -> str:
     """
     Write each query result to its own worksheet inside an **existing**
@@ -119,18 +173,28 @@ def export_to_google_sheets(
         Path to Google service-account JSON key file.
     share_with : str | None
         Optional e-mail address to grant editor access to.
+    cache_dir : str | PathLike | None
+        If given, each DataFrame is also written there as ``<qid>.feather``
+        (zstd-compressed; needs ``pyarrow``) before anything is uploaded, so
+        the results can be reloaded locally without re-querying.
 
     Returns
     -------
     str
         URL of the spreadsheet.
     """
+    if cache_dir is not None:
+        _write_feather_cache(dataframes, cache_dir)
+
     creds = _get_credentials(credentials_path)
-    service = build("sheets", "v4", credentials=creds)
-    drive_service = build("drive", "v3", credentials=creds)
+    service = _cached_build("sheets", "v4", creds)
+    drive_service = _cached_build("drive", "v3", creds)
     sheets_api = service.spreadsheets()
 
-    sorted_items = sorted(dataframes.items())
+    if dataframes.keys() <= QUERY_TITLES.keys():
+        sorted_items = [(qid, dataframes[qid]) for qid in _QUERY_ORDER if qid in dataframes]
+    else:
+        sorted_items = sorted(dataframes.items())
 
     url = f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/edit"
     print(f"Using existing spreadsheet: {url}")
@@ -143,85 +207,79 @@ def export_to_google_sheets(
     }
     print(f"  Existing worksheets: {list(existing_sheets.keys())}")
 
-    # 2. Add required worksheets (skip if already present)
-    add_requests: list[dict] = []
+    # 2. Add missing worksheets and rename the spreadsheet in a single
+    #    batchUpdate.  New sheets get client-assigned sheetIds so no reply
+    #    parsing is needed.
+    title_to_id = dict(existing_sheets)  # start with existing
+    next_sheet_id = max(existing_sheets.values(), default=0) + 1
+    structure_requests: list[dict] = []
     needed_titles: list[str] = []
     for idx, (qid, _) in enumerate(sorted_items):
         title = QUERY_TITLES.get(qid, qid)
         needed_titles.append(title)
         if title not in existing_sheets:
-            add_requests.append({
+            title_to_id[title] = next_sheet_id
+            structure_requests.append({
                 "addSheet": {
-                    "properties": {"title": title, "index": idx}
+                    "properties": {"title": title, "index": idx, "sheetId": next_sheet_id}
                 }
             })
+            next_sheet_id += 1
 
-    title_to_id = dict(existing_sheets)  # start with existing
+    structure_requests.append({
+        "updateSpreadsheetProperties": {
+            "properties": {"title": "Data Eng Assessment"},
+            "fields": "title",
+        }
+    })
+    sheets_api.batchUpdate(
+        spreadsheetId=spreadsheet_id,
+        body={"requests": structure_requests},
+    ).execute()
 
-    if add_requests:
-        resp = sheets_api.batchUpdate(
-            spreadsheetId=spreadsheet_id,
-            body={"requests": add_requests},
-        ).execute()
-        for reply in resp.get("replies", []):
-            props = reply.get("addSheet", {}).get("properties")
-            if props:
-                title_to_id[props["title"]] = props["sheetId"]
-
-    # 3. Delete worksheets that aren't needed (e.g., default "Sheet1")
-    delete_requests: list[dict] = []
-    for title, sid in existing_sheets.items():
-        if title not in needed_titles:
-            delete_requests.append({"deleteSheet": {"sheetId": sid}})
-    if delete_requests:
+    # 3. Delete worksheets that aren't needed (e.g. default "Sheet1") in their
+    #    own batch, and only once a needed sheet exists, so a rejected delete
+    #    can't undo the adds/rename above.
+    delete_requests = [
+        {"deleteSheet": {"sheetId": sid}}
+        for title, sid in existing_sheets.items()
+        if title not in needed_titles
+    ]
+    if needed_titles and delete_requests:
         try:
             sheets_api.batchUpdate(
                 spreadsheetId=spreadsheet_id,
                 body={"requests": delete_requests},
             ).execute()
         except Exception:
-            pass  # may fail if it would leave zero sheets; non-critical
+            print("  (Deleting unused worksheets skipped – non-critical)")
 
-    # 4. Rename the spreadsheet
-    sheets_api.batchUpdate(
-        spreadsheetId=spreadsheet_id,
-        body={"requests": [{
-            "updateSpreadsheetProperties": {
-                "properties": {"title": "Data Eng Assessment"},
-                "fields": "title",
-            }
-        }]},
-    ).execute()
+    # 4. Clear every target worksheet in one call
+    if needed_titles:
+        sheets_api.values().batchClear(
+            spreadsheetId=spreadsheet_id,
+            body={"ranges": [f"'{title}'" for title in needed_titles]},
+        ).execute()
 
-    # 5. Write data into each worksheet
+    # 5. Write all worksheets in one call
+    data: list[dict] = []
     format_requests: list[dict] = []
-
-    for idx, (qid, df) in enumerate(sorted_items):
+    for qid, df in sorted_items:
         title = QUERY_TITLES.get(qid, qid)
-        values = _df_to_sheet_values(df)
-        range_notation = f"'{title}'!A1"
-
-        # Clear existing content first
-        sheets_api.values().clear(
-            spreadsheetId=spreadsheet_id,
-            range=f"'{title}'",
-            body={},
-        ).execute()
+        data.append({"range": f"'{title}'!A1", "values": _df_to_sheet_values(df)})
+        format_requests.append(_build_bold_header_request(title_to_id[title], len(df.columns)))
+        format_requests.append(_build_autosize_request(title_to_id[title]))
 
-        sheets_api.values().update(
+    if data:
+        sheets_api.values().batchUpdate(
             spreadsheetId=spreadsheet_id,
-            range=range_notation,
-            valueInputOption="RAW",
-            body={"values": values},
+            body={"valueInputOption": "RAW", "data": data},
         ).execute()
 
-        print(f"  [{qid}] Wrote {len(df)} data rows to '{title}'")
-
-        # Queue formatting requests
-        format_requests.append(_build_bold_header_request(title_to_id[title], len(df.columns)))
-        format_requests.append(_build_autosize_request(title_to_id[title]))
+    for qid, df in sorted_items:
+        print(f"  [{qid}] Wrote {len(df)} data rows to '{QUERY_TITLES.get(qid, qid)}'")
 
-    # 6. Apply header formatting in a single batch
+    # 6. Apply header formatting (after the data, so autosize sees it)
     if format_requests:
         sheets_api.batchUpdate(
             spreadsheetId=spreadsheet_id,
@@ -1,78 +1,325 @@
 """
-pipeline.sitemap — Sitemap XML parsing: fetch, detect index/urlset, recurse.
+pipeline.sitemap — Sitemap XML parsing: fetch, detect index/urlset, walk nested indexes.
 """
 
-import time
+import logging
+import socket
 import xml.etree.ElementTree as ET
-from typing import Optional
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+from pipeline.hashing import url_fingerprint
+from pipeline.ratelimit import HostRateLimiter
+from pipeline.throttle import (
+    BACKOFF_BASE,
+    FETCH_CHUNK_SIZE,
+    HOST_RATE_PER_SEC,
+    MAX_RETRIES,
+    MAX_SITEMAP_SIZE,
+    MAX_WORKERS,
+    TRANSIENT_STATUS_CODES,
+)
+
+logger = logging.getLogger(__name__)
 
 # XML namespace used in the sitemap protocol
-SITEMAP_NS = {"sm": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+SITEMAP_NS_URI = "http://www.sitemaps.org/schemas/sitemap/0.9"
+SITEMAP_NS = {"sm": SITEMAP_NS_URI}
+
+# Clark-notation tags for the parse loop; avoids prefix expansion per lookup
+_SITEMAPINDEX_TAG = f"{{{SITEMAP_NS_URI}}}sitemapindex"
+_SITEMAPINDEX_TAGS = frozenset({_SITEMAPINDEX_TAG, "sitemapindex"})   # also accept un-namespaced
+_URL_TAG = f"{{{SITEMAP_NS_URI}}}url"
+_SITEMAP_TAG = f"{{{SITEMAP_NS_URI}}}sitemap"
+_LOC_TAG = f"{{{SITEMAP_NS_URI}}}loc"
+_LASTMOD_TAG = f"{{{SITEMAP_NS_URI}}}lastmod"
+
+# Advertise only the encodings urllib3 can decode here (gzip/deflate, plus br
+# or zstd when those optional packages are installed); requests decompresses.
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; SitemapBot/1.0)",
+    "Accept": "application/xml,text/xml;q=0.9,*/*;q=0.8",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+
+# Shared keep-alive session: child sitemaps reuse pooled connections to the
+# same host instead of paying a TCP+TLS handshake per fetch
+_POOL_SIZE = 32
+_RETRY = Retry(
+    total=MAX_RETRIES,
+    backoff_factor=BACKOFF_BASE,
+    status_forcelist=TRANSIENT_STATUS_CODES,
+    allowed_methods=frozenset(["GET"]),
+    raise_on_status=False,
+)
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose pooled sockets send TCP keepalive probes, so idle
+    connections between index levels are not silently dropped by middleboxes.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+        super().init_poolmanager(*args, **kwargs)
+
+
+_ADAPTER = _KeepAliveAdapter(pool_connections=_POOL_SIZE, pool_maxsize=_POOL_SIZE, max_retries=_RETRY)
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)   # set once on the session, not per request
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+
+# Per-host politeness across all sitemap workers (replaces a fixed sleep)
+_LIMITER = HostRateLimiter(HOST_RATE_PER_SEC)
+
 
-HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; SitemapBot/1.0)"}
+def fetch_xml_bytes(url: str) -> Optional[bytes]:
+    """
+    Fetch the raw XML payload of a URL without parsing it.
+    The body is streamed and abandoned (None) once it exceeds MAX_SITEMAP_SIZE.
+    """
+    host = urlsplit(url).netloc
+    try:
+        _LIMITER.acquire(host)
+        with _SESSION.get(url, timeout=30, stream=True) as resp:
+            _LIMITER.update_from_response(host, resp)
+            resp.raise_for_status()
+            buf = bytearray()
+            for chunk in resp.iter_content(chunk_size=FETCH_CHUNK_SIZE):
+                buf.extend(chunk)
+                if len(buf) > MAX_SITEMAP_SIZE:
+                    logger.error("Sitemap %s exceeds %d bytes; skipping", url, MAX_SITEMAP_SIZE)
+                    return None
+    except requests.RequestException as e:
+        # Transient statuses/connection errors were already retried by urllib3
+        logger.error("Failed to fetch %s: %s", url, e)
+        return None
+
+    return bytes(buf)
 
 
 def fetch_xml(url: str) -> Optional[ET.Element]:
     """Fetch and parse an XML document from a URL."""
+    payload = fetch_xml_bytes(url)
+    if payload is None:
+        return None
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=30)
-        resp.raise_for_status()
-        return ET.fromstring(resp.content)
-    except Exception as e:
-        print(f"  [ERROR] Failed to fetch {url}: {e}")
+        return ET.fromstring(payload)
+    except ET.ParseError as e:
+        logger.error("Failed to parse %s: %s", url, e)
         return None
 
 
 def is_sitemap_index(root: ET.Element) -> bool:
     """Check if the XML root is a sitemap index (contains nested sitemaps)."""
-    tag = root.tag.split("}")[-1] if "}" in root.tag else root.tag
-    return tag == "sitemapindex"
+    return root.tag in _SITEMAPINDEX_TAGS
 
 
-def parse_sitemap(url: str, depth: int = 0) -> list[dict]:
+class SitemapURL(NamedTuple):
     """
-    Recursively parse a sitemap URL.
-    Returns a list of dicts with keys: loc, lastmod, source_sitemap, sitemap_type
+    One <url> entry of a urlset.  A tuple row is far smaller than a dict;
+    ``record["loc"]`` style access keeps working for existing callers.
     """
-    indent = "  " * depth
-    print(f"{indent}Processing: {url}")
 
-    root = fetch_xml(url)
-    if root is None:
-        return []
+    loc: str
+    lastmod: Optional[str]
+    source_sitemap: str
+    sitemap_type: str = "urlset"
 
-    results = []
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key in self._fields:
+                return getattr(self, key)
+            raise KeyError(key)
+        return tuple.__getitem__(self, key)
+
+
+class _SitemapTarget:
+    """
+    Parser target that reads <loc>/<lastmod> straight from expat callbacks.
+
+    No Element objects are built: the target only tracks nesting depth and
+    buffers text for the two fields it needs. The first start tag decides
+    index vs urlset; each closing <url> (or <sitemap>) emits one entry.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.entries: list[tuple[Optional[str], Optional[str]]] = []   # (loc, lastmod)
+        self._entry_tag = None
+        self._depth = 0
+        self._entry_depth = 0
+        self._field = None
+        self._text: list[str] = []
+        self._loc = self._lastmod = None
+
+    def start(self, tag, attrib):
+        self._depth += 1
+        if self.index is None:
+            self.index = tag in _SITEMAPINDEX_TAGS
+            self._entry_tag = _SITEMAP_TAG if self.index else _URL_TAG
+        elif not self._entry_depth:
+            if tag == self._entry_tag:
+                self._entry_depth = self._depth
+                self._loc = self._lastmod = None
+        elif self._depth == self._entry_depth + 1 and tag in (_LOC_TAG, _LASTMOD_TAG):
+            self._field = tag
+            self._text = []
 
-    if is_sitemap_index(root):
-        print(f"{indent}  -> Sitemap Index (contains nested sitemaps)")
-        sitemap_entries = root.findall("sm:sitemap", SITEMAP_NS)
-        print(f"{indent}  -> Found {len(sitemap_entries)} child sitemap(s)")
-
-        for sitemap in sitemap_entries:
-            loc_elem = sitemap.find("sm:loc", SITEMAP_NS)
-            if loc_elem is not None and loc_elem.text:
-                child_url = loc_elem.text.strip()
-                results.extend(parse_sitemap(child_url, depth + 1))
-                time.sleep(0.2)
+    def data(self, text):
+        if self._field is not None and self._depth == self._entry_depth + 1:
+            self._text.append(text)
+
+    def end(self, tag):
+        if self._field is not None and self._depth == self._entry_depth + 1:
+            # First occurrence of each field wins
+            value = "".join(self._text)
+            if self._field == _LOC_TAG:
+                if self._loc is None:
+                    self._loc = value
+            elif self._lastmod is None:
+                self._lastmod = value
+            self._field = None
+        elif self._entry_depth and self._depth == self._entry_depth:
+            self.entries.append((self._loc, self._lastmod))
+            self._entry_depth = 0
+        self._depth -= 1
+
+    def close(self):
+        return self
+
+
+def _iter_entries(payload: bytes, target: _SitemapTarget) -> Iterator[tuple]:
+    """
+    Feed ``payload`` to an XMLParser in FETCH_CHUNK_SIZE slices, yielding the
+    target's (loc, lastmod) entries as each slice completes them.
+    """
+    parser = ET.XMLParser(target=target)
+    view = memoryview(payload)
+    for start in range(0, len(view), FETCH_CHUNK_SIZE):
+        parser.feed(view[start:start + FETCH_CHUNK_SIZE])
+        if target.entries:
+            entries, target.entries = target.entries, []
+            yield from entries
+    parser.close()
+    entries, target.entries = target.entries, []
+    yield from entries
+
+
+def _iter_records(url: str, entries: Iterable[tuple]) -> Iterator[SitemapURL]:
+    """
+    Turn urlset (loc, lastmod) entries into records, skipping exact repeats
+    within the document. Repeats across sitemaps are kept: each carries a
+    distinct source_sitemap that feeds master SOURCES.
+    """
+    seen = set()   # 64-bit fingerprints, not strings, to keep the set small
+    for loc, lastmod in entries:
+        loc = loc.strip() if loc else None
+        if not loc:
+            continue
+        lastmod = lastmod.strip() if lastmod else None
+        fp = url_fingerprint(f"{loc}\n{lastmod or ''}")
+        if fp in seen:
+            continue
+        seen.add(fp)
+        yield SitemapURL(loc, lastmod, url)
+
+
+def iter_urls(url: str) -> Iterator[SitemapURL]:
+    """
+    Stream the <url> records of a single urlset document as they are parsed.
+    Nested indexes are not followed (an index yields nothing; use
+    ``parse_sitemap`` for that). A parse error ends the stream after logging.
+    """
+    payload = fetch_xml_bytes(url)
+    if payload is None:
+        return
+    target = _SitemapTarget()
+    try:
+        for record in _iter_records(url, _iter_entries(payload, target)):
+            if target.index:
+                return
+            yield record
+    except ET.ParseError as e:
+        logger.error("Failed to parse %s: %s", url, e)
+
+
+def _parse_document(url: str, depth: int) -> tuple[list[SitemapURL], list[str]]:
+    """
+    Fetch and parse a single sitemap document without following children.
+    Returns (url records, child sitemap URLs).
+    """
+    debug = logger.isEnabledFor(logging.DEBUG)
+    indent = "  " * depth if debug else ""
+    if debug:
+        logger.debug("%sProcessing: %s", indent, url)
+
+    payload = fetch_xml_bytes(url)
+    if payload is None:
+        return [], []
+
+    target = _SitemapTarget()
+    try:
+        entries = list(_iter_entries(payload, target))
+    except ET.ParseError as e:
+        logger.error("Failed to parse %s: %s", url, e)
+        return [], []
+
+    results = []
+    child_urls = []
+    if target.index:
+        child_urls = [loc.strip() for loc, _ in entries if loc]
     else:
-        url_entries = root.findall("sm:url", SITEMAP_NS)
-        print(f"{indent}  -> URL Set with {len(url_entries)} URL(s)")
+        results = list(_iter_records(url, entries))
+
+    if debug:
+        if target.index:
+            logger.debug("%s  -> Sitemap Index with %d child sitemap(s)", indent, len(child_urls))
+        else:
+            logger.debug("%s  -> URL Set with %d URL(s)", indent, len(results))
 
-        for entry in url_entries:
-            loc_elem = entry.find("sm:loc", SITEMAP_NS)
-            lastmod_elem = entry.find("sm:lastmod", SITEMAP_NS)
+    return results, child_urls
 
-            loc = loc_elem.text.strip() if loc_elem is not None and loc_elem.text else None
-            lastmod = lastmod_elem.text.strip() if lastmod_elem is not None and lastmod_elem.text else None
 
-            if loc:
-                results.append({
-                    "loc": loc,
-                    "lastmod": lastmod,
-                    "source_sitemap": url,
-                    "sitemap_type": "urlset",
-                })
+def parse_sitemap(url: str, depth: int = 0) -> Iterator[SitemapURL]:
+    """
+    Parse a sitemap URL, following nested sitemap indexes.
+    Yields ``SitemapURL`` rows: loc, lastmod, source_sitemap, sitemap_type
+
+    Indexes are walked breadth-first: every sitemap on the current frontier is
+    fetched in parallel (bounded by MAX_WORKERS) before moving a level deeper.
+    Each sitemap URL is fetched at most once, which also breaks index cycles.
+    Records are yielded level by level: the parsed records of the current
+    frontier level (up to every sitemap on it, as the pool finishes them) are
+    held in memory, but earlier levels are released rather than accumulating
+    the whole tree.  Use ``iter_urls`` to stream a single large urlset.
+    """
+    visited = {url}
+    frontier = deque([url])
 
-    return results
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        while frontier:
+            level = list(frontier)
+            frontier.clear()
+            # map keeps frontier order, so output is deterministic per level
+            for records, child_urls in pool.map(_parse_document, level, repeat(depth)):
+                yield from records
+                for child_url in child_urls:
+                    if child_url not in visited:
+                        visited.add(child_url)
+                        frontier.append(child_url)
+            depth += 1
@@ -2,17 +2,57 @@
 pipeline.throttle — Rate-limiting constants and configuration.
 """
 
-FETCH_BATCH_SIZE = 500
-MAX_WORKERS = 5
-REQUEST_TIMEOUT = 30
-MAX_RETRIES = 3
-BACKOFF_BASE = 2
-THROTTLE_DELAY = 0.3
-MAX_CONTENT_SIZE = 5 * 1024 * 1024        # 5 MB
-MAX_CONSECUTIVE_FAILURES = 5
-TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+import random
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class ThrottleConfig:
+    """Immutable bundle of fetch/throttle settings."""
+
+    fetch_batch_size: int = 500
+    max_workers: int = 5
+    request_timeout: int = 30
+    max_retries: int = 3
+    backoff_base: int = 2
+    backoff_cap: float = 60.0                      # ceiling for a single retry sleep
+    throttle_delay: float = 0.3
+    max_content_size: int = 5 * 1024 * 1024        # 5 MB
+    max_sitemap_size: int = 50 * 1024 * 1024       # 50 MB, the sitemap protocol limit
+    fetch_chunk_size: int = 256 * 1024             # 256 KB per streamed read
+    max_consecutive_failures: int = 5
+    host_rate_per_sec: float = 5.0                 # token-bucket rate per remote host
+    transient_status_codes: frozenset[int] = frozenset({408, 429, 500, 502, 503, 504})
+
+
+CONFIG = ThrottleConfig()
+
+# Flat aliases kept for existing ``from pipeline.throttle import ...`` callers
+FETCH_BATCH_SIZE = CONFIG.fetch_batch_size
+MAX_WORKERS = CONFIG.max_workers
+REQUEST_TIMEOUT = CONFIG.request_timeout
+MAX_RETRIES = CONFIG.max_retries
+BACKOFF_BASE = CONFIG.backoff_base
+BACKOFF_CAP = CONFIG.backoff_cap
+THROTTLE_DELAY = CONFIG.throttle_delay
+MAX_CONTENT_SIZE = CONFIG.max_content_size
+MAX_SITEMAP_SIZE = CONFIG.max_sitemap_size
+FETCH_CHUNK_SIZE = CONFIG.fetch_chunk_size
+MAX_CONSECUTIVE_FAILURES = CONFIG.max_consecutive_failures
+HOST_RATE_PER_SEC = CONFIG.host_rate_per_sec
+TRANSIENT_STATUS_CODES = CONFIG.transient_status_codes
 
 FETCH_HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; DocIngestionBot/1.0)",
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Connection": "keep-alive",
 }
+
+
+def compute_backoff(prev: float = BACKOFF_BASE) -> float:
+    """
+    Next retry delay using decorrelated jitter: uniform in
+    ``[BACKOFF_BASE, prev * 3]``, capped at BACKOFF_CAP.  Workers that fail
+    together spread their retries out instead of retrying in lock-step.
+    """
+    return min(BACKOFF_CAP, random.uniform(BACKOFF_BASE, prev * 3))
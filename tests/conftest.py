@@ -3,7 +3,8 @@ tests/conftest.py — Shared fixtures and sample XML payloads for the test suite
 """
 
 import xml.etree.ElementTree as ET
-from unittest.mock import MagicMock
+from dataclasses import dataclass, field
+from unittest.mock import MagicMock, patch
 
 import pytest
 import requests
@@ -47,16 +48,78 @@ CHILD_URLSET_XML = f"""\
 
 
 
+@dataclass(slots=True)
+class FakeResponse:
+    """
+    Minimal stand-in for ``requests.Response`` covering what the pipeline
+    touches: status/content/headers, streamed reads, context-manager use and
+    ``raise_for_status``.
+    """
+
+    content: bytes = b""
+    status_code: int = 200
+    headers: dict = field(default_factory=dict)
+    encoding: str | None = None       # declared charset, as requests reports it
+    chunks: list | None = None        # explicit iter_content pieces, if given
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        if self.chunks is not None:
+            return iter(self.chunks)
+        content = self.content
+        return (content[i:i + chunk_size] for i in range(0, len(content), chunk_size))
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}", response=self)
+
+    def close(self):
+        pass
+
+
 def mock_http_response(content: bytes, status_code: int = 200):
-    """Return a mock ``requests.Response`` with the given content."""
-    resp = MagicMock(spec=requests.Response)
-    resp.status_code = status_code
-    resp.content = content
-    resp.raise_for_status = MagicMock()
-    if status_code >= 400:
-        resp.raise_for_status.side_effect = requests.HTTPError(response=resp)
-    return resp
+    """Return a ``FakeResponse`` with the given content."""
+    return FakeResponse(content=content, status_code=status_code)
+
 
+def make_response(
+    status: int = 200,
+    body: bytes = b"",
+    chunks: list | None = None,
+    encoding: str | None = None,
+):
+    """
+    Return a ``FakeResponse`` with ``status``; streamed reads yield ``body``
+    in one piece, or ``chunks`` verbatim (bytes or str) when given.
+    """
+    return FakeResponse(
+        content=body,
+        status_code=status,
+        encoding=encoding,
+        chunks=chunks if chunks is not None else [body],
+    )
+
+
+
+# The shared per-host token buckets keep state (tokens, Retry-After pauses)
+# across calls; stub them for every test so fetches don't leak it or sleep.
+@pytest.fixture(autouse=True)
+def ingest_limiter():
+    """Stand-in for ``pipeline.ingest._LIMITER``."""
+    with patch("pipeline.ingest._LIMITER") as limiter:
+        yield limiter
+
+
+@pytest.fixture(autouse=True)
+def sitemap_limiter():
+    """Stand-in for ``pipeline.sitemap._LIMITER``."""
+    with patch("pipeline.sitemap._LIMITER") as limiter:
+        yield limiter
 
 
 @pytest.fixture
@@ -65,19 +128,20 @@ def mock_cursor():
     return MagicMock()
 
 
-@pytest.fixture
+# Parsed roots are shared for the whole session; tests must not mutate them.
+@pytest.fixture(scope="session")
 def urlset_root():
     """Parsed ET.Element for a simple urlset."""
     return ET.fromstring(URLSET_XML)
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sitemap_index_root():
     """Parsed ET.Element for a sitemap index."""
     return ET.fromstring(SITEMAP_INDEX_XML)
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def child_urlset_root():
     """Parsed ET.Element for a child urlset."""
     return ET.fromstring(CHILD_URLSET_XML)
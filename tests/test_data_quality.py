@@ -3,7 +3,8 @@ Data-quality tests — Schema validation, null handling, constraint enforcement.
 """
 
 import hashlib
-import xml.etree.ElementTree as ET
+import re
+from functools import lru_cache
 from unittest.mock import MagicMock, patch
 
 from pipeline.sitemap import parse_sitemap
@@ -18,39 +19,42 @@ from pipeline.consolidate import merge_staging_to_master
 from tests.conftest import SITEMAP_NS_URI
 
 
+@lru_cache(maxsize=None)
+def _capture_ddl(create_fn):
+    """Uppercased DDL emitted by ``create_fn``; captured once per function."""
+    cursor = MagicMock()
+    create_fn(cursor)
+    return cursor.execute.call_args[0][0].upper()
+
+
 class TestSchemaValidation:
     """Verify that DDL produced by pipeline helpers conforms to expected schema."""
 
-    def _capture_ddl(self, create_fn):
-        cursor = MagicMock()
-        create_fn(cursor)
-        return cursor.execute.call_args[0][0].upper()
-
     def test_staging_table_has_not_null_on_loc(self):
-        ddl = self._capture_ddl(create_staging_table)
+        ddl = _capture_ddl(create_staging_table)
         assert "LOC" in ddl
         assert "NOT NULL" in ddl
 
     def test_master_table_has_primary_key(self):
-        ddl = self._capture_ddl(create_master_table)
+        ddl = _capture_ddl(create_master_table)
         assert "PRIMARY KEY" in ddl
 
     def test_content_table_has_primary_key(self):
-        ddl = self._capture_ddl(create_content_table)
+        ddl = _capture_ddl(create_content_table)
         assert "PRIMARY KEY" in ddl
 
     def test_staging_table_columns(self):
-        ddl = self._capture_ddl(create_staging_table)
+        ddl = _capture_ddl(create_staging_table)
         for col in ["LOC", "LASTMOD", "SOURCE_SITEMAP", "SITEMAP_TYPE", "EXTRACTED_AT"]:
             assert col in ddl, f"Missing column {col} in staging DDL"
 
     def test_master_table_columns(self):
-        ddl = self._capture_ddl(create_master_table)
+        ddl = _capture_ddl(create_master_table)
         for col in ["LOC", "LASTMOD", "SOURCES", "FIRST_SEEN_AT", "LAST_SEEN_AT"]:
             assert col in ddl, f"Missing column {col} in master DDL"
 
     def test_content_table_columns(self):
-        ddl = self._capture_ddl(create_content_table)
+        ddl = _capture_ddl(create_content_table)
         for col in [
             "LOC", "CONTENT", "CONTENT_HASH", "CONTENT_SIZE_BYTES",
             "HTTP_STATUS", "FETCH_STATUS", "RETRY_COUNT",
@@ -60,25 +64,25 @@ class TestSchemaValidation:
             assert col in ddl, f"Missing column {col} in content DDL"
 
     def test_content_table_default_values(self):
-        ddl = self._capture_ddl(create_content_table)
+        ddl = _capture_ddl(create_content_table)
         assert "DEFAULT 0" in ddl
 
 
 class TestNullHandling:
     """Verify pipeline functions handle None / missing data gracefully."""
 
-    @patch("pipeline.sitemap.fetch_xml")
+    @patch("pipeline.sitemap.fetch_xml_bytes")
     def test_missing_lastmod_yields_none(self, mock_fetch_xml):
         xml = f"""\
 <?xml version="1.0" encoding="UTF-8"?>
 <urlset xmlns="{SITEMAP_NS_URI}">
   <url><loc>https://example.com/no-mod</loc></url>
 </urlset>""".encode("utf-8")
-        mock_fetch_xml.return_value = ET.fromstring(xml)
-        results = parse_sitemap("https://example.com/sitemap.xml")
-        assert results[0]["lastmod"] is None
+        mock_fetch_xml.return_value = xml
+        results = list(parse_sitemap("https://example.com/sitemap.xml"))
+        assert results[0].lastmod is None
 
-    @patch("pipeline.sitemap.fetch_xml")
+    @patch("pipeline.sitemap.fetch_xml_bytes")
     def test_missing_loc_element_skipped(self, mock_fetch_xml):
         xml = f"""\
 <?xml version="1.0" encoding="UTF-8"?>
@@ -86,17 +90,17 @@ class TestNullHandling:
   <url><lastmod>2025-01-01</lastmod></url>
   <url><loc>https://example.com/ok</loc></url>
 </urlset>""".encode("utf-8")
-        mock_fetch_xml.return_value = ET.fromstring(xml)
-        results = parse_sitemap("https://example.com/sitemap.xml")
+        mock_fetch_xml.return_value = xml
+        results = list(parse_sitemap("https://example.com/sitemap.xml"))
         assert len(results) == 1
-        assert results[0]["loc"] == "https://example.com/ok"
+        assert results[0].loc == "https://example.com/ok"
 
     def test_compute_hash_empty_content(self):
         h = compute_hash("")
         assert h == hashlib.sha256(b"").hexdigest()
 
     @patch("pipeline.ingest.time.sleep")
-    @patch("pipeline.ingest.requests.get")
+    @patch("pipeline.ingest._SESSION.get")
     def test_fetch_document_failure_returns_none_content(self, mock_get, mock_sleep):
         ctx = MagicMock()
         ctx.__enter__ = MagicMock(return_value=ctx)
@@ -128,11 +132,18 @@ class TestConstraintEnforcement:
         sql = cursor.execute.call_args[0][0].upper()
         assert "DISTINCT" in sql
 
+    def test_merge_sources_has_no_correlated_subquery(self):
+        cursor = MagicMock()
+        cursor.fetchone.return_value = (0, 0)
+        merge_staging_to_master(cursor)
+        sql = cursor.execute.call_args[0][0].upper()
+        assert "SPLIT_TO_TABLE" not in sql
+        assert "ARRAY_DISTINCT" in sql
+
+    def test_master_sources_is_array(self):
+        ddl = _capture_ddl(create_master_table)
+        assert re.search(r"SOURCES\s+ARRAY\b", ddl)
+
     def test_master_table_loc_is_varchar_2000(self):
-        ddl = self._capture_ddl(create_master_table)
+        ddl = _capture_ddl(create_master_table)
         assert "VARCHAR(2000)" in ddl
-
-    def _capture_ddl(self, create_fn):
-        cursor = MagicMock()
-        create_fn(cursor)
-        return cursor.execute.call_args[0][0].upper()
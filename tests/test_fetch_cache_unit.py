@@ -0,0 +1,70 @@
+"""
+Unit tests — On-disk fetch cache (ResponseCache).
+"""
+
+import sqlite3
+import zlib
+from unittest.mock import patch
+
+import pytest
+
+from pipeline.fetch_cache import ResponseCache
+from pipeline.hashing import compute_hash
+
+
+def _result(content: str) -> dict:
+    return {
+        "content": content,
+        "content_hash": compute_hash(content),
+        "content_size_bytes": len(content.encode("utf-8")),
+        "http_status": 200,
+        "fetch_status": "success",
+        "retry_count": 2,
+    }
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = ResponseCache(str(tmp_path / "ingest.sqlite"), ttl=60)
+    yield c
+    c.close()
+
+
+class TestResponseCache:
+    """pipeline.fetch_cache.ResponseCache — store / lookup / expiry."""
+
+    def test_miss_returns_none(self, cache):
+        assert cache.get("https://example.com/page") is None
+
+    def test_round_trip_marks_hit_as_cached_success(self, cache):
+        stored = _result("<html>café</html>")
+        cache.put("https://example.com/page", stored)
+        hit = cache.get("https://example.com/page")
+        assert hit == {**stored, "retry_count": 0, "from_cache": True}
+        assert hit["fetch_status"] == "success"
+
+    def test_body_stored_compressed(self, cache):
+        content = "<p>repeated</p>" * 1000
+        cache.put("https://example.com/page", _result(content))
+        (body,) = sqlite3.connect(cache.path).execute("SELECT body FROM responses").fetchone()
+        assert len(body) < len(content) / 10
+        assert zlib.decompress(body).decode("utf-8") == content
+
+    def test_expired_entry_is_a_miss(self, cache):
+        with patch("pipeline.fetch_cache.time.time", return_value=1000.0):
+            cache.put("https://example.com/page", _result("old"))
+        with patch("pipeline.fetch_cache.time.time", return_value=1061.0):
+            assert cache.get("https://example.com/page") is None
+
+    def test_put_replaces_previous_entry(self, cache):
+        cache.put("https://example.com/page", _result("v1"))
+        cache.put("https://example.com/page", _result("v2"))
+        assert cache.get("https://example.com/page")["content"] == "v2"
+
+    def test_persists_across_instances(self, cache):
+        cache.put("https://example.com/page", _result("kept"))
+        reopened = ResponseCache(cache.path)
+        try:
+            assert reopened.get("https://example.com/page")["content"] == "kept"
+        finally:
+            reopened.close()
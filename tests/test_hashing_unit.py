@@ -4,7 +4,7 @@ Unit tests — Hash generation (compute_hash).
 
 import hashlib
 
-from pipeline.hashing import compute_hash
+from pipeline.hashing import compute_hash, url_fingerprint
 
 
 class TestComputeHash:
@@ -30,3 +30,22 @@ class TestComputeHash:
     def test_unicode_content(self):
         h = compute_hash("日本語テキスト 🚀")
         assert isinstance(h, str) and len(h) == 64
+
+    def test_bytes_match_str(self):
+        content = "日本語テキスト 🚀"
+        raw = content.encode("utf-8")
+        assert compute_hash(raw) == compute_hash(content)
+        assert compute_hash(bytearray(raw)) == compute_hash(content)
+
+
+class TestUrlFingerprint:
+    """pipeline.hashing.url_fingerprint — 64-bit URL fingerprints."""
+
+    def test_deterministic_64_bit_int(self):
+        fp = url_fingerprint("https://docs.snowflake.com/en/page1")
+        assert fp == url_fingerprint("https://docs.snowflake.com/en/page1")
+        assert 0 <= fp < 2 ** 64
+
+    def test_distinct_urls_distinct_fingerprints(self):
+        urls = [f"https://docs.snowflake.com/en/page{i}" for i in range(10_000)]
+        assert len({url_fingerprint(u) for u in urls}) == len(urls)
@@ -2,34 +2,44 @@
 Integration tests — End-to-end consolidation, idempotency, observability & alerting.
 """
 
+import csv
 import hashlib
-import xml.etree.ElementTree as ET
+import os
+import re
+import uuid
 from datetime import datetime, timedelta, timezone
 from unittest.mock import MagicMock, patch
 
+import pandas as pd
 import pytest
 import requests
 
 from pipeline.sitemap import parse_sitemap
 from pipeline.db import (
     STAGING_TABLE,
+    STAGING_AGG_TABLE,
     MASTER_TABLE,
+    BULK_INSERT_THRESHOLD,
     create_staging_table,
     create_master_table,
     create_content_table,
     create_metrics_table,
     create_alerts_table,
+    migrate_master_sources,
     save_metrics,
     save_alerts,
     get_historical_avg_duration,
+    fetch_observability_snapshot,
 )
 from pipeline.consolidate import merge_staging_to_master
 from pipeline.observability import (
     start_pipeline_run,
     finish_pipeline_run,
     evaluate_alerts,
+    evaluate_alerts_batch,
     evaluate_staleness_alert,
     _make_alert,
+    _new_alert_ids,
 )
 from tests.conftest import URLSET_XML
 
@@ -40,11 +50,10 @@ class TestEndToEndConsolidation:
     All HTTP and Snowflake calls are mocked.
     """
 
-    @patch("pipeline.sitemap.time.sleep")
-    @patch("pipeline.sitemap.fetch_xml")
-    def test_full_pipeline_mock(self, mock_fetch_xml, mock_sleep):
-        mock_fetch_xml.return_value = ET.fromstring(URLSET_XML)
-        records = parse_sitemap("https://example.com/sitemap.xml")
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_full_pipeline_mock(self, mock_fetch_xml):
+        mock_fetch_xml.return_value = URLSET_XML
+        records = list(parse_sitemap("https://example.com/sitemap.xml"))
         assert len(records) == 2
 
         cursor = MagicMock()
@@ -59,9 +68,8 @@ class TestEndToEndConsolidation:
         assert cursor.execute.call_count == 1
         assert result == (2, 0)
 
-    @patch("pipeline.sitemap.time.sleep")
-    @patch("pipeline.sitemap.fetch_xml")
-    def test_merge_sql_references_correct_tables(self, mock_fetch_xml, mock_sleep):
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_merge_sql_references_correct_tables(self, mock_fetch_xml):
         cursor = MagicMock()
         cursor.fetchone.return_value = (0, 0)
         merge_staging_to_master(cursor)
@@ -69,22 +77,67 @@ class TestEndToEndConsolidation:
         assert STAGING_TABLE in sql_executed
         assert MASTER_TABLE in sql_executed
 
+    def test_materialized_merge_uses_transient_table(self):
+        cursor = MagicMock()
+        cursor.fetchone.return_value = (3, 1)
+        result = merge_staging_to_master(cursor, materialize_staging=True)
+        assert result == (3, 1)
+
+        statements = [c[0][0].upper() for c in cursor.execute.call_args_list]
+        assert len(statements) == 3
+        assert "CREATE OR REPLACE TRANSIENT TABLE" in statements[0]
+        assert "CLUSTER BY (LOC)" in statements[0]
+        assert f"USING {STAGING_AGG_TABLE} AS SRC" in statements[1]
+        assert statements[2].startswith(f"DROP TABLE IF EXISTS {STAGING_AGG_TABLE}")
+
+    def test_materialized_merge_drops_table_on_failure(self):
+        cursor = MagicMock()
+        cursor.execute.side_effect = [None, RuntimeError("merge failed"), None]
+        with pytest.raises(RuntimeError):
+            merge_staging_to_master(cursor, materialize_staging=True)
+        assert "DROP TABLE" in cursor.execute.call_args[0][0].upper()
+
+
+class TestMigrateMasterSources:
+    """migrate_master_sources — one-time VARCHAR → ARRAY upgrade of SOURCES."""
+
+    def test_text_column_converted(self, mock_cursor):
+        mock_cursor.fetchone.return_value = ("TEXT",)
+        assert migrate_master_sources(mock_cursor) is True
+
+        statements = [c[0][0] for c in mock_cursor.execute.call_args_list]
+        assert "INFORMATION_SCHEMA.COLUMNS" in statements[0]
+        assert mock_cursor.execute.call_args_list[0][0][1] == (MASTER_TABLE,)
+        assert f"ALTER TABLE {MASTER_TABLE} ADD COLUMN SOURCES_ARR ARRAY" in statements[1]
+        assert "SPLIT(SOURCES, ',')" in statements[2]
+        assert statements[3] == f"ALTER TABLE {MASTER_TABLE} DROP COLUMN SOURCES"
+        assert statements[4] == f"ALTER TABLE {MASTER_TABLE} RENAME COLUMN SOURCES_ARR TO SOURCES"
+
+    def test_array_column_left_alone(self, mock_cursor):
+        mock_cursor.fetchone.return_value = ("ARRAY",)
+        assert migrate_master_sources(mock_cursor) is False
+        assert mock_cursor.execute.call_count == 1
+
+    def test_missing_table_left_alone(self, mock_cursor):
+        mock_cursor.fetchone.return_value = None
+        assert migrate_master_sources(mock_cursor) is False
+        assert mock_cursor.execute.call_count == 1
+
 
 class TestIdempotency:
     """Running the full consolidation twice produces the same row counts."""
 
-    @patch("pipeline.sitemap.time.sleep")
-    @patch("pipeline.sitemap.fetch_xml")
-    def test_double_run_same_row_count(self, mock_fetch_xml, mock_sleep):
-        mock_fetch_xml.return_value = ET.fromstring(URLSET_XML)
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_double_run_same_row_count(self, mock_fetch_xml):
+        mock_fetch_xml.return_value = URLSET_XML
 
-        records_run1 = parse_sitemap("https://example.com/sitemap.xml")
+        records_run1 = list(parse_sitemap("https://example.com/sitemap.xml"))
         cursor = MagicMock()
         cursor.fetchone.return_value = (2, 0)
         result1 = merge_staging_to_master(cursor)
 
-        mock_fetch_xml.return_value = ET.fromstring(URLSET_XML)
-        records_run2 = parse_sitemap("https://example.com/sitemap.xml")
+        mock_fetch_xml.return_value = URLSET_XML
+        records_run2 = list(parse_sitemap("https://example.com/sitemap.xml"))
         cursor.reset_mock()
         cursor.fetchone.return_value = (0, 2)
         result2 = merge_staging_to_master(cursor)
@@ -93,13 +146,12 @@ class TestIdempotency:
         assert result1[0] == 2
         assert result2[0] == 0
 
-    @patch("pipeline.sitemap.time.sleep")
-    @patch("pipeline.sitemap.fetch_xml")
-    def test_parse_sitemap_idempotent(self, mock_fetch_xml, mock_sleep):
-        mock_fetch_xml.return_value = ET.fromstring(URLSET_XML)
-        run1 = parse_sitemap("https://example.com/sitemap.xml")
-        mock_fetch_xml.return_value = ET.fromstring(URLSET_XML)
-        run2 = parse_sitemap("https://example.com/sitemap.xml")
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_parse_sitemap_idempotent(self, mock_fetch_xml):
+        mock_fetch_xml.return_value = URLSET_XML
+        run1 = list(parse_sitemap("https://example.com/sitemap.xml"))
+        mock_fetch_xml.return_value = URLSET_XML
+        run2 = list(parse_sitemap("https://example.com/sitemap.xml"))
         assert run1 == run2
 
 
@@ -273,6 +325,63 @@ class TestEvaluateAlerts:
         assert "failure_rate" in categories
         assert "empty_results" in categories
 
+    def test_alerts_in_one_evaluation_share_timestamp(self):
+        m = self._make_metrics(
+            fetch_success=50, fetch_failed=50,
+            urls_inserted=0, urls_updated=0,
+        )
+        alerts = evaluate_alerts(m)
+        assert len(alerts) == 2
+        assert alerts[0]["created_at"] is alerts[1]["created_at"]
+
+
+class TestEvaluateAlertsBatch:
+
+    def _runs(self):
+        runs = []
+        for success, failed, inserted, duration in [
+            (100, 0, 100, 40.0),   # healthy
+            (85, 15, 10, 55.0),    # failure-rate warning
+            (60, 40, 0, 150.0),    # critical + empty + slow
+        ]:
+            m = start_pipeline_run("backfill")
+            m.update(fetch_success=success, fetch_failed=failed, urls_inserted=inserted)
+            m = finish_pipeline_run(m)
+            m["duration_seconds"] = duration
+            runs.append(m)
+        return runs
+
+    def test_matches_scalar_evaluation(self):
+        runs = self._runs()
+        expected = {
+            (a["run_id"], a["condition_name"], a["severity"], a["message"])
+            for m in runs
+            for a in evaluate_alerts(m, historical_avg_duration=50.0)
+        }
+        batch = evaluate_alerts_batch(pd.DataFrame(runs), historical_avg_duration=50.0)
+        got = {(a["run_id"], a["condition_name"], a["severity"], a["message"]) for a in batch}
+        assert got == expected
+        assert len(batch) == len(expected)
+
+    def test_accepts_snowflake_column_names(self):
+        df = pd.DataFrame(self._runs()).rename(columns=str.upper)
+        alerts = evaluate_alerts_batch(df)
+        assert {a["condition_name"] for a in alerts} == {
+            "failure_rate_warning", "failure_rate_critical", "empty_result_set",
+        }
+
+    def test_alert_ids_unique_uuid4(self):
+        alerts = evaluate_alerts_batch(pd.DataFrame(self._runs()), historical_avg_duration=50.0)
+        ids = [a["alert_id"] for a in alerts]
+        assert len(set(ids)) == len(ids)
+        assert all(uuid.UUID(i).version == 4 for i in ids)
+
+    def test_empty_frame_no_alerts(self):
+        df = pd.DataFrame(columns=[
+            "run_id", "failure_rate_pct", "urls_inserted", "urls_updated", "duration_seconds",
+        ])
+        assert evaluate_alerts_batch(df, historical_avg_duration=10.0) == []
+
 
 class TestStalenessAlert:
 
@@ -341,12 +450,48 @@ class TestHistoricalAvgDuration:
         assert "AVG" in sql
 
 
+class TestObservabilitySnapshot:
+
+    def test_single_query_returns_all_fields(self):
+        cursor = MagicMock()
+        last = datetime.now(timezone.utc) - timedelta(hours=2)
+        cursor.fetchone.return_value = (last, 42.5, 7)
+        snap = fetch_observability_snapshot(cursor)
+        assert cursor.execute.call_count == 1
+        assert snap == {"last_run_end": last, "hist_avg_duration": 42.5, "hist_sample_count": 7}
+
+    def test_no_history(self):
+        cursor = MagicMock()
+        cursor.fetchone.return_value = (None, None, 0)
+        snap = fetch_observability_snapshot(cursor)
+        assert snap["last_run_end"] is None
+        assert snap["hist_avg_duration"] is None
+        assert snap["hist_sample_count"] == 0
+
+    def test_alerts_evaluated_from_snapshot_without_queries(self):
+        cursor = MagicMock()
+        snap = {
+            "last_run_end": datetime.now(timezone.utc) - timedelta(hours=30),
+            "hist_avg_duration": 50.0,
+            "hist_sample_count": 10,
+        }
+        m = start_pipeline_run("test")
+        m["urls_inserted"] = 10
+        m = finish_pipeline_run(m)
+        m["duration_seconds"] = 120.0
+
+        alerts = evaluate_alerts(m, snapshot=snap) + evaluate_staleness_alert(cursor, snapshot=snap)
+        assert {a["category"] for a in alerts} == {"performance", "staleness"}
+        cursor.execute.assert_not_called()
+
+
 class TestSaveAlerts:
 
     def test_no_alerts_no_inserts(self):
         cursor = MagicMock()
         save_alerts(cursor, [])
         cursor.execute.assert_not_called()
+        cursor.executemany.assert_not_called()
 
     def test_multiple_alerts_inserted(self):
         cursor = MagicMock()
@@ -355,11 +500,66 @@ class TestSaveAlerts:
             _make_alert("r2", "CRITICAL", "cat2", "cond2", "msg2", 3.0, 4.0),
         ]
         save_alerts(cursor, alerts)
-        assert cursor.execute.call_count == 2
-        for call_args in cursor.execute.call_args_list:
-            sql = call_args[0][0].upper()
-            assert "INSERT INTO" in sql
-            assert "ALERTS" in sql
+        cursor.execute.assert_not_called()
+        assert cursor.executemany.call_count == 1
+        sql, rows = cursor.executemany.call_args[0]
+        assert "INSERT INTO" in sql.upper()
+        assert "ALERTS" in sql.upper()
+        assert rows == alerts
+
+    def test_large_batch_uses_stage_copy(self):
+        cursor = MagicMock()
+        alerts = [
+            _make_alert("r1", "WARNING", "cat", "cond", f"msg {i}", 1.0, 2.0)
+            for i in range(BULK_INSERT_THRESHOLD + 1)
+        ]
+        save_alerts(cursor, alerts)
+        cursor.executemany.assert_not_called()
+        statements = [c[0][0].strip().upper() for c in cursor.execute.call_args_list]
+        assert len(statements) == 2
+        assert statements[0].startswith("PUT ")
+        assert statements[1].startswith("COPY INTO ALERTS")
+
+    def test_stage_copy_file_matches_alerts_ddl(self):
+        """The staged CSV lines up with the ALERTS DDL and is the file COPY loads."""
+        ddl_cursor = MagicMock()
+        create_alerts_table(ddl_cursor)
+        ddl = ddl_cursor.execute.call_args[0][0]
+        ddl_columns = re.findall(r"^\s+([A-Z_]+)\s", ddl.split("(", 1)[1], re.MULTILINE)
+
+        staged = {}
+
+        def _execute(sql):
+            match = re.match(r"\s*PUT 'file://(.+?)' @%ALERTS\b", sql)
+            if match:   # the temp dir is gone once save_alerts returns
+                path = match.group(1)
+                with open(path, newline="", encoding="utf-8") as fh:
+                    staged["name"] = os.path.basename(path)
+                    staged["text"] = fh.read()
+
+        cursor = MagicMock()
+        cursor.execute.side_effect = _execute
+        alerts = [
+            _make_alert("r1", "WARNING", "cat", "cond", f"msg {i}", 1.0, 2.0)
+            for i in range(BULK_INSERT_THRESHOLD + 1)
+        ]
+        alerts[0]["message"] = 'rows dropped, "staging" empty'
+        save_alerts(cursor, alerts)
+
+        copy_sql = cursor.execute.call_args_list[1][0][0]
+        copy_columns = re.search(r"COPY INTO ALERTS \((.*?)\)", copy_sql, re.DOTALL).group(1)
+        assert [c.strip() for c in copy_columns.split(",")] == ddl_columns
+        assert re.search(r"FILES = \('(.+?)'\)", copy_sql).group(1) == staged["name"] + ".gz"
+
+        rows = list(csv.reader(staged["text"].splitlines()))
+        assert len(rows) == len(alerts)
+        for row, alert in zip(rows, alerts):
+            assert len(row) == len(ddl_columns)
+            fields = dict(zip(ddl_columns, row))
+            assert fields.pop("ACKNOWLEDGED") == "FALSE"
+            assert fields == {col: str(alert[col.lower()]) for col in fields}
+        # Commas and quotes survive FIELD_OPTIONALLY_ENCLOSED_BY = '"'
+        assert '"rows dropped, ""staging"" empty"' in staged["text"].splitlines()[0]
 
 
 class TestAlertDictStructure:
@@ -373,10 +573,20 @@ class TestAlertDictStructure:
         assert expected_keys == set(a.keys())
 
     def test_alert_id_is_uuid(self):
-        import uuid
         a = _make_alert("run1", "CRITICAL", "test", "cond", "msg", 0, 0)
         uuid.UUID(a["alert_id"])
 
     def test_created_at_is_utc(self):
         a = _make_alert("run1", "WARNING", "test", "cond", "msg", 0, 0)
         assert a["created_at"].tzinfo == timezone.utc
+
+    def test_preallocated_ids_are_uuid4(self):
+        ids = _new_alert_ids(50)
+        assert len(set(ids)) == 50
+        assert all(uuid.UUID(i).version == 4 for i in ids)
+        assert _new_alert_ids(0) == []
+
+    def test_explicit_created_at_used(self):
+        ts = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        a = _make_alert("run1", "WARNING", "test", "cond", "msg", 0, 0, created_at=ts)
+        assert a["created_at"] == ts
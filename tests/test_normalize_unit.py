@@ -2,29 +2,28 @@
 Unit tests — URL normalization (whitespace stripping, empty-loc handling).
 """
 
-import xml.etree.ElementTree as ET
 from unittest.mock import patch
 
 from pipeline.sitemap import parse_sitemap
-from pipeline.normalize import normalize_url
+from pipeline.normalize import _cached_urlparse, normalize_url, normalize_urls
 from tests.conftest import SITEMAP_NS_URI
 
 
 class TestUrlNormalization:
     """Verify that the parser preserves / trims URL loc values correctly."""
 
-    @patch("pipeline.sitemap.fetch_xml")
+    @patch("pipeline.sitemap.fetch_xml_bytes")
     def test_whitespace_stripped(self, mock_fetch_xml):
         xml = f"""\
 <?xml version="1.0" encoding="UTF-8"?>
 <urlset xmlns="{SITEMAP_NS_URI}">
   <url><loc>  https://example.com/page  </loc></url>
 </urlset>""".encode("utf-8")
-        mock_fetch_xml.return_value = ET.fromstring(xml)
-        results = parse_sitemap("https://example.com/sitemap.xml")
-        assert results[0]["loc"] == "https://example.com/page"
+        mock_fetch_xml.return_value = xml
+        results = list(parse_sitemap("https://example.com/sitemap.xml"))
+        assert results[0].loc == "https://example.com/page"
 
-    @patch("pipeline.sitemap.fetch_xml")
+    @patch("pipeline.sitemap.fetch_xml_bytes")
     def test_empty_loc_skipped(self, mock_fetch_xml):
         xml = f"""\
 <?xml version="1.0" encoding="UTF-8"?>
@@ -32,10 +31,10 @@ class TestUrlNormalization:
   <url><loc></loc></url>
   <url><loc>https://example.com/valid</loc></url>
 </urlset>""".encode("utf-8")
-        mock_fetch_xml.return_value = ET.fromstring(xml)
-        results = parse_sitemap("https://example.com/sitemap.xml")
+        mock_fetch_xml.return_value = xml
+        results = list(parse_sitemap("https://example.com/sitemap.xml"))
         assert len(results) == 1
-        assert results[0]["loc"] == "https://example.com/valid"
+        assert results[0].loc == "https://example.com/valid"
 
 
 class TestNormalizeUrlFunction:
@@ -58,3 +57,40 @@ class TestNormalizeUrlFunction:
         result = normalize_url("https://example.com/")
         # Root path should have at least the slash
         assert result.endswith("example.com") or result.endswith("example.com/")
+
+    def test_duplicate_slashes_collapsed(self):
+        assert normalize_url("https://example.com///a////b") == "https://example.com/a/b"
+
+    def test_canonical_url_returned_unchanged(self):
+        url = "https://docs.snowflake.com/en/user-guide/intro?lang=en"
+        assert normalize_url(url) == url
+
+    def test_percent_encoded_path_takes_full_path(self):
+        assert normalize_url("https://example.com/a%7Eb") == "https://example.com/a~b"
+
+
+class TestNormalizeUrlsBatch:
+    """pipeline.normalize.normalize_urls — batch normalization."""
+
+    def test_matches_per_url_normalization(self):
+        urls = [
+            "HTTPS://Example.COM/page/",
+            "https://example.com:443//a//b",
+            "HTTPS://Example.COM/page/",
+        ]
+        assert normalize_urls(urls) == [normalize_url(u) for u in urls]
+
+    def test_empty_batch(self):
+        assert normalize_urls([]) == []
+
+
+class TestCachedUrlparse:
+    """pipeline.normalize._cached_urlparse — memoized URL parsing."""
+
+    def test_repeat_parse_hits_cache(self):
+        _cached_urlparse.cache_clear()
+        url = "HTTPS://Example.COM:443/a//b/"
+        assert normalize_url(url) == normalize_url(url) == "https://example.com/a/b"
+        info = _cached_urlparse.cache_info()
+        assert info.misses == 1
+        assert info.hits == 1
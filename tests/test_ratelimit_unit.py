@@ -0,0 +1,83 @@
+"""
+Unit tests — Per-host token-bucket rate limiting (HostRateLimiter).
+"""
+
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from pipeline.ratelimit import HostRateLimiter, parse_retry_after
+
+
+class FakeClock:
+    """Monotonic clock that only advances when ``sleep`` is called."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    fake = FakeClock()
+    with patch("pipeline.ratelimit.time.monotonic", fake.monotonic), \
+            patch("pipeline.ratelimit.time.sleep", fake.sleep):
+        yield fake
+
+
+class TestParseRetryAfter:
+    """pipeline.ratelimit.parse_retry_after — header parsing."""
+
+    def test_delta_seconds(self):
+        assert parse_retry_after("120") == 120.0
+
+    def test_http_date(self):
+        when = datetime.now(timezone.utc) + timedelta(seconds=60)
+        delay = parse_retry_after(format_datetime(when, usegmt=True))
+        assert 55 <= delay <= 60
+
+    def test_missing_or_garbage_returns_none(self):
+        assert parse_retry_after(None) is None
+        assert parse_retry_after("soon") is None
+
+
+class TestHostRateLimiter:
+    """pipeline.ratelimit.HostRateLimiter — token bucket per host."""
+
+    def test_burst_passes_without_sleeping(self, clock):
+        limiter = HostRateLimiter(rate_per_sec=5)
+        for _ in range(5):
+            limiter.acquire("docs.snowflake.com")
+        assert clock.sleeps == []
+
+    def test_waits_once_bucket_empty(self, clock):
+        limiter = HostRateLimiter(rate_per_sec=5)
+        for _ in range(6):
+            limiter.acquire("docs.snowflake.com")
+        assert clock.sleeps == [pytest.approx(0.2)]
+
+    def test_hosts_have_independent_buckets(self, clock):
+        limiter = HostRateLimiter(rate_per_sec=1)
+        limiter.acquire("a.example.com")
+        limiter.acquire("b.example.com")
+        assert clock.sleeps == []
+
+    def test_retry_after_pauses_host(self, clock):
+        limiter = HostRateLimiter(rate_per_sec=5)
+        resp = MagicMock(headers={"Retry-After": "3"})
+        limiter.update_from_response("docs.snowflake.com", resp)
+        limiter.acquire("docs.snowflake.com")
+        assert sum(clock.sleeps) == pytest.approx(3)
+
+    def test_rejects_non_positive_rate(self):
+        with pytest.raises(ValueError):
+            HostRateLimiter(rate_per_sec=0)
@@ -12,10 +12,13 @@ import pytest
 from pipeline.sheets_export import (
     QUERY_TITLES,
     SCOPES,
+    _QUERY_ORDER,
     _df_to_sheet_values,
     _build_bold_header_request,
     _build_autosize_request,
+    _cached_build,
     _get_credentials,
+    _load_creds,
     export_to_google_sheets,
 )
 
@@ -46,6 +49,19 @@ class TestDfToSheetValues:
             for cell in row:
                 assert isinstance(cell, str)
 
+    def test_numeric_columns_match_pandas_stringification(self):
+        df = pd.DataFrame({
+            "I": [1, -20, 300],
+            "F": [0.1, float("nan"), 1e16],
+            "B": [True, False, True],
+            "S": ["a", None, "c"],
+        })
+        expected = [df.columns.tolist()] + [
+            list(row) for row in zip(*(df[c].fillna("").astype(str).tolist() for c in df))
+        ]
+        assert _df_to_sheet_values(df) == expected
+        assert _df_to_sheet_values(df)[2] == ["-20", "", "False", ""]
+
 
 class TestBoldHeaderRequest:
     """_build_bold_header_request — formatting payload."""
@@ -87,6 +103,20 @@ class TestGetCredentials:
         with pytest.raises(FileNotFoundError, match="fake.json"):
             _get_credentials(None)
 
+    @patch("pipeline.sheets_export.Credentials.from_service_account_file")
+    def test_credentials_cached(self, mock_loader, tmp_path, monkeypatch):
+        _load_creds.cache_clear()
+        key = tmp_path / "sa.json"
+        key.write_text("{}")
+        monkeypatch.chdir(tmp_path)
+
+        first = _get_credentials(str(key))
+        second = _get_credentials("sa.json")   # same file via a relative path
+
+        assert first is second
+        mock_loader.assert_called_once_with(str(key), scopes=SCOPES)
+        _load_creds.cache_clear()
+
 
 class TestQueryTitles:
     def test_all_five_present(self):
@@ -96,83 +126,142 @@ class TestQueryTitles:
         for v in QUERY_TITLES.values():
             assert isinstance(v, str) and len(v) > 0
 
+    def test_query_order_is_sorted_ids(self):
+        assert _QUERY_ORDER == tuple(sorted(QUERY_TITLES))
 
-class TestExportToGoogleSheets:
-    """export_to_google_sheets — end-to-end with mocked Sheets/Drive APIs."""
 
-    def _sample_dfs(self) -> dict[str, pd.DataFrame]:
-        return {
-            "4a": pd.DataFrame({"SOURCE": ["s1", "s2"], "COUNT": [10, 20]}),
-            "4b": pd.DataFrame({"MONTH": ["2025-01"], "DOCS": [5]}),
-            "4c": pd.DataFrame({"SRC": ["s1"], "RATE": [99.5]}),
-            "4d": pd.DataFrame({"SEGMENT": ["en"], "FREQ": [100]}),
-            "4e": pd.DataFrame({"TOTAL": [200], "STALE": [15]}),
-        }
+@pytest.fixture(scope="module")
+def sample_dfs() -> dict[str, pd.DataFrame]:
+    """Five small query results; export only reads them, so one set is shared."""
+    return {
+        "4a": pd.DataFrame({"SOURCE": ["s1", "s2"], "COUNT": [10, 20]}),
+        "4b": pd.DataFrame({"MONTH": ["2025-01"], "DOCS": [5]}),
+        "4c": pd.DataFrame({"SRC": ["s1"], "RATE": [99.5]}),
+        "4d": pd.DataFrame({"SEGMENT": ["en"], "FREQ": [100]}),
+        "4e": pd.DataFrame({"TOTAL": [200], "STALE": [15]}),
+    }
 
-    def _setup_mocks(self, mock_build):
-        """Create and wire up Sheets + Drive mock services."""
-        mock_sheets = MagicMock()
-        mock_drive = MagicMock()
 
-        def _pick_service(api, version, credentials):
-            return mock_sheets if api == "sheets" else mock_drive
-        mock_build.side_effect = _pick_service
+@pytest.fixture
+def sheets_mocks():
+    """
+    Patch credentials and ``build`` with wired Sheets + Drive mock services.
+    Yields ``(mock_sheets, mock_drive, sheets_api)``.
+    """
+    mock_sheets = MagicMock()
+    mock_drive = MagicMock()
 
-        sheets_api = mock_sheets.spreadsheets.return_value
+    def _pick_service(api, version, credentials):
+        return mock_sheets if api == "sheets" else mock_drive
 
-        # Simulate existing spreadsheet with one default "Sheet1"
-        sheets_api.get.return_value.execute.return_value = {
-            "sheets": [{"properties": {"title": "Sheet1", "sheetId": 0}}]
-        }
-        # batchUpdate for addSheet returns sheetId per new sheet
-        add_replies = [
-            {"addSheet": {"properties": {"title": QUERY_TITLES[qid], "sheetId": idx + 1}}}
-            for idx, qid in enumerate(sorted(QUERY_TITLES))
-        ]
-        sheets_api.batchUpdate.return_value.execute.return_value = {
-            "replies": add_replies,
-        }
-        sheets_api.values.return_value.update.return_value.execute.return_value = {}
-        sheets_api.values.return_value.clear.return_value.execute.return_value = {}
+    sheets_api = mock_sheets.spreadsheets.return_value
 
-        return mock_sheets, mock_drive, sheets_api
+    # Simulate existing spreadsheet with one default "Sheet1"
+    sheets_api.get.return_value.execute.return_value = {
+        "sheets": [{"properties": {"title": "Sheet1", "sheetId": 0}}]
+    }
+    sheets_api.batchUpdate.return_value.execute.return_value = {"replies": []}
+    sheets_api.values.return_value.batchUpdate.return_value.execute.return_value = {}
+    sheets_api.values.return_value.batchClear.return_value.execute.return_value = {}
 
-    @patch("pipeline.sheets_export._get_credentials")
-    @patch("pipeline.sheets_export.build")
-    def test_writes_to_existing_spreadsheet(self, mock_build, mock_creds):
-        mock_sheets, mock_drive, sheets_api = self._setup_mocks(mock_build)
+    with patch("pipeline.sheets_export._get_credentials"), \
+            patch("pipeline.sheets_export.build", side_effect=_pick_service):
+        yield mock_sheets, mock_drive, sheets_api
+
+
+@pytest.fixture(autouse=True)
+def _fresh_build_cache():
+    """Keep memoised API clients from leaking mocks between tests."""
+    _cached_build.cache_clear()
+    yield
+    _cached_build.cache_clear()
 
-        dfs = self._sample_dfs()
-        url = export_to_google_sheets(dfs, spreadsheet_id="abc123")
+
+class TestExportToGoogleSheets:
+    """export_to_google_sheets — end-to-end with mocked Sheets/Drive APIs."""
+
+    def test_writes_to_existing_spreadsheet(self, sheets_mocks, sample_dfs):
+        mock_sheets, mock_drive, sheets_api = sheets_mocks
+
+        url = export_to_google_sheets(sample_dfs, spreadsheet_id="abc123")
 
         assert "abc123" in url
         # Should NOT call create — we write to an existing spreadsheet
         sheets_api.create.assert_not_called()
         # Should fetch existing metadata
         sheets_api.get.assert_called_once()
-        # One values().update() per query
-        assert sheets_api.values.return_value.update.call_count == 5
+        # All five worksheets written by a single values().batchUpdate()
+        sheets_api.values.return_value.update.assert_not_called()
+        assert sheets_api.values.return_value.batchUpdate.call_count == 1
+        body = sheets_api.values.return_value.batchUpdate.call_args[1]["body"]
+        assert len(body["data"]) == 5
 
-    @patch("pipeline.sheets_export._get_credentials")
-    @patch("pipeline.sheets_export.build")
-    def test_adds_worksheets_and_deletes_default(self, mock_build, mock_creds):
-        mock_sheets, mock_drive, sheets_api = self._setup_mocks(mock_build)
+    def test_adds_worksheets_and_deletes_default(self, sheets_mocks, sample_dfs):
+        mock_sheets, mock_drive, sheets_api = sheets_mocks
 
-        export_to_google_sheets(self._sample_dfs(), spreadsheet_id="abc123")
+        export_to_google_sheets(sample_dfs, spreadsheet_id="abc123")
 
-        # First batchUpdate should include addSheet requests for 5 queries
+        # First batchUpdate: addSheet for 5 queries plus the rename
         first_batch_call = sheets_api.batchUpdate.call_args_list[0]
         requests = first_batch_call[1]["body"]["requests"]
         add_sheet_requests = [r for r in requests if "addSheet" in r]
         assert len(add_sheet_requests) == 5
+        assert "updateSpreadsheetProperties" in requests[5]
+        assert not any("deleteSheet" in r for r in requests)
+        # ...then the default-sheet delete on its own
+        second = sheets_api.batchUpdate.call_args_list[1]
+        assert second[1]["body"]["requests"] == [{"deleteSheet": {"sheetId": 0}}]
 
-    @patch("pipeline.sheets_export._get_credentials")
-    @patch("pipeline.sheets_export.build")
-    def test_share_with_creates_permission(self, mock_build, mock_creds):
-        mock_sheets, mock_drive, sheets_api = self._setup_mocks(mock_build)
+    def test_rejected_delete_does_not_abort_export(self, sheets_mocks, sample_dfs):
+        mock_sheets, mock_drive, sheets_api = sheets_mocks
+        ok = MagicMock()
+        rejected = MagicMock()
+        rejected.execute.side_effect = RuntimeError("cannot delete")
+        sheets_api.batchUpdate.side_effect = [ok, rejected, ok]
+
+        url = export_to_google_sheets(sample_dfs, spreadsheet_id="abc123")
+
+        assert "abc123" in url
+        assert sheets_api.values.return_value.batchUpdate.call_count == 1
+        assert sheets_api.batchUpdate.call_count == 3
+
+    def test_empty_export_keeps_existing_sheets(self, sheets_mocks):
+        """With nothing to write, no sheet is deleted and no empty value batch is sent."""
+        mock_sheets, mock_drive, sheets_api = sheets_mocks
+
+        export_to_google_sheets({}, spreadsheet_id="abc123")
+
+        assert sheets_api.batchUpdate.call_count == 1
+        requests = sheets_api.batchUpdate.call_args[1]["body"]["requests"]
+        assert [list(r) for r in requests] == [["updateSpreadsheetProperties"]]
+        sheets_api.values.return_value.batchClear.assert_not_called()
+        sheets_api.values.return_value.batchUpdate.assert_not_called()
+
+    def test_new_sheet_ids_used_for_formatting(self, sheets_mocks, sample_dfs):
+        mock_sheets, mock_drive, sheets_api = sheets_mocks
+
+        export_to_google_sheets(sample_dfs, spreadsheet_id="abc123")
+
+        first = sheets_api.batchUpdate.call_args_list[0]
+        last = sheets_api.batchUpdate.call_args_list[-1]
+        added_ids = {
+            r["addSheet"]["properties"]["sheetId"]
+            for r in first[1]["body"]["requests"] if "addSheet" in r
+        }
+        formatted_ids = {
+            r["repeatCell"]["range"]["sheetId"]
+            for r in last[1]["body"]["requests"] if "repeatCell" in r
+        }
+        assert 0 not in added_ids
+        assert added_ids == formatted_ids
+        # Structure, unused-sheet delete and formatting round trips
+        assert sheets_api.batchUpdate.call_count == 3
+
+    def test_share_with_creates_permission(self, sheets_mocks, sample_dfs):
+        mock_sheets, mock_drive, sheets_api = sheets_mocks
 
         export_to_google_sheets(
-            self._sample_dfs(),
+            sample_dfs,
             spreadsheet_id="xyz",
             share_with="alice@example.com",
         )
@@ -182,31 +271,46 @@ class TestExportToGoogleSheets:
         assert perm_body["emailAddress"] == "alice@example.com"
         assert perm_body["role"] == "writer"
 
-    @patch("pipeline.sheets_export._get_credentials")
-    @patch("pipeline.sheets_export.build")
-    def test_no_share_skips_drive_permission(self, mock_build, mock_creds):
-        mock_sheets, mock_drive, sheets_api = self._setup_mocks(mock_build)
+    def test_no_share_skips_drive_permission(self, sheets_mocks, sample_dfs):
+        mock_sheets, mock_drive, sheets_api = sheets_mocks
 
-        export_to_google_sheets(self._sample_dfs(), spreadsheet_id="id1")
+        export_to_google_sheets(sample_dfs, spreadsheet_id="id1")
 
         mock_drive.permissions.return_value.create.assert_not_called()
 
-    @patch("pipeline.sheets_export._get_credentials")
-    @patch("pipeline.sheets_export.build")
-    def test_clears_cells_before_writing(self, mock_build, mock_creds):
-        mock_sheets, mock_drive, sheets_api = self._setup_mocks(mock_build)
+    def test_clears_cells_before_writing(self, sheets_mocks, sample_dfs):
+        mock_sheets, mock_drive, sheets_api = sheets_mocks
 
-        export_to_google_sheets(self._sample_dfs(), spreadsheet_id="id2")
+        export_to_google_sheets(sample_dfs, spreadsheet_id="id2")
 
-        # One clear() per worksheet
-        assert sheets_api.values.return_value.clear.call_count == 5
+        # All worksheets cleared by a single batchClear()
+        sheets_api.values.return_value.clear.assert_not_called()
+        assert sheets_api.values.return_value.batchClear.call_count == 1
+        body = sheets_api.values.return_value.batchClear.call_args[1]["body"]
+        assert len(body["ranges"]) == 5
 
-    @patch("pipeline.sheets_export._get_credentials")
-    @patch("pipeline.sheets_export.build")
-    def test_formatting_batch_has_bold_and_autosize(self, mock_build, mock_creds):
-        mock_sheets, mock_drive, sheets_api = self._setup_mocks(mock_build)
+    def test_values_batched_clear_then_write(self, sheets_mocks, sample_dfs):
+        mock_sheets, mock_drive, sheets_api = sheets_mocks
+
+        export_to_google_sheets(sample_dfs, spreadsheet_id="id4")
+
+        values_api = sheets_api.values.return_value
+        called = [c[0] for c in values_api.mock_calls if c[0] in ("batchClear", "batchUpdate")]
+        assert called == ["batchClear", "batchUpdate"]
 
-        export_to_google_sheets(self._sample_dfs(), spreadsheet_id="id3")
+        titles = [QUERY_TITLES[qid] for qid in _QUERY_ORDER]
+        clear_body = values_api.batchClear.call_args[1]["body"]
+        assert clear_body["ranges"] == [f"'{t}'" for t in titles]
+
+        write_body = values_api.batchUpdate.call_args[1]["body"]
+        assert write_body["valueInputOption"] == "RAW"
+        assert [d["range"] for d in write_body["data"]] == [f"'{t}'!A1" for t in titles]
+        assert write_body["data"][0]["values"] == _df_to_sheet_values(sample_dfs["4a"])
+
+    def test_formatting_batch_has_bold_and_autosize(self, sheets_mocks, sample_dfs):
+        mock_sheets, mock_drive, sheets_api = sheets_mocks
+
+        export_to_google_sheets(sample_dfs, spreadsheet_id="id3")
 
         # Find the formatting batchUpdate call (has repeatCell requests)
         for c in sheets_api.batchUpdate.call_args_list:
@@ -217,3 +321,41 @@ class TestExportToGoogleSheets:
                 assert len(reqs) == 10
                 return
         pytest.fail("No formatting batchUpdate call found")
+
+    def test_unknown_query_ids_sorted_with_known(self, sheets_mocks, sample_dfs):
+        mock_sheets, mock_drive, sheets_api = sheets_mocks
+        dfs = {"3z": sample_dfs["4a"], **sample_dfs}
+
+        export_to_google_sheets(dfs, spreadsheet_id="id5")
+
+        body = sheets_api.values.return_value.batchUpdate.call_args[1]["body"]
+        ranges = [d["range"] for d in body["data"]]
+        assert ranges[0] == "'3z'!A1"
+        assert ranges[1:] == [f"'{QUERY_TITLES[qid]}'!A1" for qid in _QUERY_ORDER]
+
+    def test_cache_dir_writes_feather(self, sheets_mocks, sample_dfs, tmp_path):
+        pytest.importorskip("pyarrow")
+        cache_dir = tmp_path / "results"
+
+        export_to_google_sheets(sample_dfs, spreadsheet_id="id6", cache_dir=cache_dir)
+
+        assert sorted(p.name for p in cache_dir.iterdir()) == [f"{qid}.feather" for qid in _QUERY_ORDER]
+        for qid, df in sample_dfs.items():
+            pd.testing.assert_frame_equal(pd.read_feather(cache_dir / f"{qid}.feather"), df)
+
+    def test_no_cache_dir_writes_nothing(self, sheets_mocks, sample_dfs, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        export_to_google_sheets(sample_dfs, spreadsheet_id="id7")
+        assert list(tmp_path.iterdir()) == []
+
+    @patch("pipeline.sheets_export._get_credentials")
+    @patch("pipeline.sheets_export.build")
+    def test_services_built_once_per_credentials(self, mock_build, mock_creds, sample_dfs):
+        export_to_google_sheets(sample_dfs, spreadsheet_id="id8")
+        export_to_google_sheets(sample_dfs, spreadsheet_id="id9")
+
+        creds = mock_creds.return_value
+        assert mock_build.call_args_list == [
+            call("sheets", "v4", credentials=creds),
+            call("drive", "v3", credentials=creds),
+        ]
@@ -2,13 +2,27 @@
 Unit tests — Sitemap XML parsing (fetch_xml, is_sitemap_index, parse_sitemap).
 """
 
+import socket
+import threading
+import tracemalloc
 import xml.etree.ElementTree as ET
 from unittest.mock import MagicMock, patch
 
 import pytest
 import requests
 
-from pipeline.sitemap import fetch_xml, is_sitemap_index, parse_sitemap
+from pipeline.sitemap import (
+    _SESSION,
+    _SitemapTarget,
+    HEADERS,
+    SitemapURL,
+    fetch_xml,
+    fetch_xml_bytes,
+    is_sitemap_index,
+    iter_urls,
+    parse_sitemap,
+)
+from pipeline.throttle import MAX_RETRIES, TRANSIENT_STATUS_CODES
 from tests.conftest import (
     URLSET_XML,
     SITEMAP_INDEX_XML,
@@ -21,91 +35,420 @@ from tests.conftest import (
 class TestFetchXml:
     """pipeline.sitemap.fetch_xml — HTTP fetch + XML parse."""
 
-    @patch("pipeline.sitemap.requests.get")
+    @patch("pipeline.sitemap._SESSION.get")
     def test_valid_xml_returns_element(self, mock_get):
         mock_get.return_value = mock_http_response(URLSET_XML)
         root = fetch_xml("https://example.com/sitemap.xml")
         assert root is not None
         assert isinstance(root, ET.Element)
 
-    @patch("pipeline.sitemap.requests.get")
+    @patch("pipeline.sitemap._SESSION.get")
     def test_http_error_returns_none(self, mock_get):
         mock_get.return_value = mock_http_response(b"", 500)
         root = fetch_xml("https://example.com/bad.xml")
         assert root is None
 
-    @patch("pipeline.sitemap.requests.get", side_effect=requests.ConnectionError("refused"))
+    @patch("pipeline.sitemap._SESSION.get", side_effect=requests.ConnectionError("refused"))
     def test_connection_error_returns_none(self, mock_get):
         root = fetch_xml("https://example.com/down.xml")
         assert root is None
 
+    @patch("pipeline.sitemap._SESSION.get")
+    def test_repeat_call_refetches(self, mock_get):
+        """No payload is kept between calls, so a later run never sees stale XML."""
+        mock_get.side_effect = [mock_http_response(URLSET_XML), mock_http_response(CHILD_URLSET_XML)]
+        assert fetch_xml_bytes("https://example.com/sitemap.xml") == URLSET_XML
+        assert fetch_xml_bytes("https://example.com/sitemap.xml") == CHILD_URLSET_XML
+
+    @patch("pipeline.sitemap._SESSION.get")
+    def test_fetch_goes_through_host_limiter(self, mock_get, sitemap_limiter):
+        resp = mock_http_response(URLSET_XML)
+        mock_get.return_value = resp
+        fetch_xml_bytes("https://docs.snowflake.com/sitemap.xml")
+        sitemap_limiter.acquire.assert_called_once_with("docs.snowflake.com")
+        sitemap_limiter.update_from_response.assert_called_once_with("docs.snowflake.com", resp)
+
+    @patch("pipeline.sitemap._SESSION.get")
+    def test_fetch_recovers_after_failure(self, mock_get):
+        mock_get.side_effect = [
+            requests.ConnectionError("refused"),
+            mock_http_response(URLSET_XML),
+        ]
+        assert fetch_xml_bytes("https://example.com/flaky.xml") is None
+        assert fetch_xml_bytes("https://example.com/flaky.xml") == URLSET_XML
+
+    @patch("pipeline.sitemap.MAX_SITEMAP_SIZE", 64)
+    @patch("pipeline.sitemap.FETCH_CHUNK_SIZE", 16)
+    @patch("pipeline.sitemap._SESSION.get")
+    def test_oversized_payload_rejected(self, mock_get):
+        mock_get.return_value = mock_http_response(URLSET_XML)
+        assert fetch_xml_bytes("https://example.com/huge.xml") is None
+        mock_get.assert_called_once()
+        assert mock_get.call_args.kwargs["stream"] is True
+
+    @patch("pipeline.sitemap._SESSION.get")
+    def test_malformed_xml_returns_none(self, mock_get):
+        mock_get.return_value = mock_http_response(b"<urlset><url>")
+        assert fetch_xml("https://example.com/broken.xml") is None
+
+    def test_session_pools_and_retries_transient_statuses(self):
+        adapter = _SESSION.get_adapter("https://docs.snowflake.com/sitemap.xml")
+        assert adapter._pool_maxsize == 32
+        assert adapter.max_retries.total == MAX_RETRIES
+        assert set(adapter.max_retries.status_forcelist) == set(TRANSIENT_STATUS_CODES)
+        assert adapter.max_retries.allowed_methods == frozenset(["GET"])
+
+    def test_session_sends_headers_and_keepalive(self):
+        assert _SESSION.headers["Accept-Encoding"] == HEADERS["Accept-Encoding"]
+        adapter = _SESSION.get_adapter("https://docs.snowflake.com/sitemap.xml")
+        socket_options = adapter.poolmanager.connection_pool_kw["socket_options"]
+        assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) in socket_options
+
+    def test_headers_request_compressed_xml(self):
+        assert "gzip" in HEADERS["Accept-Encoding"]
+        assert HEADERS["Accept"].startswith("application/xml")
+
+    @patch("pipeline.sitemap._SESSION.get", side_effect=ValueError("bug"))
+    def test_unexpected_errors_propagate(self, mock_get):
+        with pytest.raises(ValueError):
+            fetch_xml_bytes("https://example.com/sitemap.xml")
+
 
 class TestIsSitemapIndex:
     """pipeline.sitemap.is_sitemap_index — tag detection."""
 
-    def test_urlset_returns_false(self):
-        root = ET.fromstring(URLSET_XML)
-        assert is_sitemap_index(root) is False
+    def test_urlset_returns_false(self, urlset_root):
+        assert is_sitemap_index(urlset_root) is False
+
+    def test_child_urlset_returns_false(self, child_urlset_root):
+        assert is_sitemap_index(child_urlset_root) is False
+
+    def test_sitemapindex_returns_true(self, sitemap_index_root):
+        assert is_sitemap_index(sitemap_index_root) is True
 
-    def test_sitemapindex_returns_true(self):
-        root = ET.fromstring(SITEMAP_INDEX_XML)
-        assert is_sitemap_index(root) is True
+    def test_unnamespaced_sitemapindex_returns_true(self):
+        assert is_sitemap_index(ET.Element("sitemapindex")) is True
+
+    def test_foreign_namespace_sitemapindex_returns_false(self):
+        assert is_sitemap_index(ET.Element("{urn:other}sitemapindex")) is False
 
 
 class TestParseSitemap:
     """pipeline.sitemap.parse_sitemap — recursive sitemap parsing."""
 
-    @patch("pipeline.sitemap.fetch_xml")
+    @patch("pipeline.sitemap.fetch_xml_bytes")
     def test_urlset_extracts_all_urls(self, mock_fetch_xml):
-        mock_fetch_xml.return_value = ET.fromstring(URLSET_XML)
-        results = parse_sitemap("https://example.com/sitemap.xml")
+        mock_fetch_xml.return_value = URLSET_XML
+        results = list(parse_sitemap("https://example.com/sitemap.xml"))
 
         assert len(results) == 2
-        locs = {r["loc"] for r in results}
+        locs = {r.loc for r in results}
         assert "https://docs.snowflake.com/en/page1" in locs
         assert "https://docs.snowflake.com/en/page2" in locs
 
-    @patch("pipeline.sitemap.fetch_xml")
+    @patch("pipeline.sitemap.fetch_xml_bytes")
     def test_lastmod_parsed_when_present(self, mock_fetch_xml):
-        mock_fetch_xml.return_value = ET.fromstring(URLSET_XML)
-        results = parse_sitemap("https://example.com/sitemap.xml")
-
-        page1 = next(r for r in results if "page1" in r["loc"])
-        page2 = next(r for r in results if "page2" in r["loc"])
-        assert page1["lastmod"] == "2025-12-01"
-        assert page2["lastmod"] is None
-
-    @patch("pipeline.sitemap.time.sleep")
-    @patch("pipeline.sitemap.fetch_xml")
-    def test_sitemap_index_recurses(self, mock_fetch_xml, mock_sleep):
-        """A sitemap-index with 2 children → fetch_xml called 3 times total."""
-        call_count = {"n": 0}
-        roots = [
-            ET.fromstring(SITEMAP_INDEX_XML),
-            ET.fromstring(CHILD_URLSET_XML),
-            ET.fromstring(CHILD_URLSET_XML),
-        ]
+        mock_fetch_xml.return_value = URLSET_XML
+        results = list(parse_sitemap("https://example.com/sitemap.xml"))
 
-        def _side(url):
-            idx = call_count["n"]
-            call_count["n"] += 1
-            return roots[idx]
+        page1 = next(r for r in results if "page1" in r.loc)
+        page2 = next(r for r in results if "page2" in r.loc)
+        assert page1.lastmod == "2025-12-01"
+        assert page2.lastmod is None
 
-        mock_fetch_xml.side_effect = _side
-        results = parse_sitemap("https://example.com/sitemap.xml")
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_sitemap_index_recurses(self, mock_fetch_xml):
+        """A sitemap-index with 2 children → fetch_xml_bytes called 3 times total."""
+        payloads = {
+            "https://example.com/sitemap.xml": SITEMAP_INDEX_XML,
+            "https://docs.snowflake.com/sitemap-child1.xml": CHILD_URLSET_XML,
+            "https://docs.snowflake.com/sitemap-child2.xml": CHILD_URLSET_XML,
+        }
+        # Children are fetched concurrently, so key responses by URL, not call order
+        mock_fetch_xml.side_effect = payloads.get
+        results = list(parse_sitemap("https://example.com/sitemap.xml"))
         assert len(results) == 2
         assert mock_fetch_xml.call_count == 3
+        assert {r.source_sitemap for r in results} == set(list(payloads)[1:])
+
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_sibling_completion_order_does_not_change_output(self, mock_fetch_xml):
+        """Children are fetched in parallel; a slow first child still comes first."""
+        child1_xml = CHILD_URLSET_XML.replace(b"child-page", b"child-one")
+        child2_xml = CHILD_URLSET_XML.replace(b"child-page", b"child-two")
+        child2_done = threading.Event()
+
+        def fetch(url):
+            if url.endswith("child1.xml"):
+                # Only returns once the sibling finished: proves the overlap
+                assert child2_done.wait(timeout=5)
+                return child1_xml
+            if url.endswith("child2.xml"):
+                child2_done.set()
+                return child2_xml
+            return SITEMAP_INDEX_XML
+
+        mock_fetch_xml.side_effect = fetch
+        results = list(parse_sitemap("https://example.com/sitemap.xml"))
+        assert [r.loc for r in results] == [
+            "https://docs.snowflake.com/en/child-one",
+            "https://docs.snowflake.com/en/child-two",
+        ]
+        assert mock_fetch_xml.call_count == 3
 
-    @patch("pipeline.sitemap.fetch_xml", return_value=None)
+    @patch("pipeline.sitemap.fetch_xml_bytes", return_value=None)
     def test_unreachable_url_returns_empty(self, mock_fetch_xml):
-        results = parse_sitemap("https://example.com/gone.xml")
+        results = list(parse_sitemap("https://example.com/gone.xml"))
         assert results == []
 
-    @patch("pipeline.sitemap.fetch_xml")
+    @patch("pipeline.sitemap.fetch_xml_bytes")
     def test_source_sitemap_field_set(self, mock_fetch_xml):
-        mock_fetch_xml.return_value = ET.fromstring(URLSET_XML)
+        mock_fetch_xml.return_value = URLSET_XML
         url = "https://example.com/sitemap.xml"
-        results = parse_sitemap(url)
+        results = list(parse_sitemap(url))
         for r in results:
-            assert r["source_sitemap"] == url
-            assert r["sitemap_type"] == "urlset"
+            assert r.source_sitemap == url
+            assert r.sitemap_type == "urlset"
+
+    @patch("pipeline.sitemap.fetch_xml_bytes", return_value=b"<urlset><url><loc>x")
+    def test_malformed_xml_returns_empty(self, mock_fetch_xml):
+        assert list(parse_sitemap("https://example.com/broken.xml")) == []
+
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_large_urlset_streamed(self, mock_fetch_xml):
+        entries = "".join(
+            f"<url><loc>https://docs.snowflake.com/en/p{i}</loc></url>" for i in range(5000)
+        )
+        mock_fetch_xml.return_value = (
+            f'<urlset xmlns="{SITEMAP_NS_URI}">{entries}</urlset>'.encode("utf-8")
+        )
+        results = list(parse_sitemap("https://example.com/sitemap.xml"))
+        assert len(results) == 5000
+        assert results[0].loc == "https://docs.snowflake.com/en/p0"
+        assert results[-1].loc == "https://docs.snowflake.com/en/p4999"
+
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_foreign_namespace_loc_ignored(self, mock_fetch_xml):
+        """Only sitemap-namespace <loc> counts; image:loc extensions are skipped."""
+        mock_fetch_xml.return_value = f"""\
+<urlset xmlns="{SITEMAP_NS_URI}" xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">
+  <url>
+    <image:image><image:loc>https://docs.snowflake.com/img.png</image:loc></image:image>
+    <loc>https://docs.snowflake.com/en/page1</loc>
+  </url>
+</urlset>""".encode("utf-8")
+        results = list(parse_sitemap("https://example.com/sitemap.xml"))
+        assert [r.loc for r in results] == ["https://docs.snowflake.com/en/page1"]
+
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_first_loc_wins_when_duplicated(self, mock_fetch_xml):
+        mock_fetch_xml.return_value = f"""\
+<urlset xmlns="{SITEMAP_NS_URI}">
+  <url>
+    <lastmod>2025-10-01</lastmod>
+    <loc>https://docs.snowflake.com/en/first</loc>
+    <loc>https://docs.snowflake.com/en/second</loc>
+  </url>
+</urlset>""".encode("utf-8")
+        results = list(parse_sitemap("https://example.com/sitemap.xml"))
+        assert results[0].loc == "https://docs.snowflake.com/en/first"
+        assert results[0].lastmod == "2025-10-01"
+
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_nested_index_walked_breadth_first(self, mock_fetch_xml):
+        """Index → (index, urlset) → urlset: each sitemap fetched once, level by level."""
+        def index_of(*locs):
+            entries = "".join(f"<sitemap><loc>{loc}</loc></sitemap>" for loc in locs)
+            return f'<sitemapindex xmlns="{SITEMAP_NS_URI}">{entries}</sitemapindex>'.encode()
+
+        payloads = {
+            "https://example.com/root.xml": index_of(
+                "https://example.com/nested.xml", "https://example.com/a.xml"
+            ),
+            "https://example.com/nested.xml": index_of("https://example.com/b.xml"),
+            "https://example.com/a.xml": CHILD_URLSET_XML,
+            "https://example.com/b.xml": URLSET_XML,
+        }
+        mock_fetch_xml.side_effect = payloads.get
+        results = list(parse_sitemap("https://example.com/root.xml"))
+
+        assert mock_fetch_xml.call_count == 4
+        assert [r.source_sitemap for r in results] == [
+            "https://example.com/a.xml",
+            "https://example.com/b.xml",
+            "https://example.com/b.xml",
+        ]
+
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_index_cycle_terminates(self, mock_fetch_xml):
+        mock_fetch_xml.return_value = (
+            f'<sitemapindex xmlns="{SITEMAP_NS_URI}">'
+            "<sitemap><loc>https://example.com/sitemap.xml</loc></sitemap>"
+            "</sitemapindex>"
+        ).encode()
+        assert list(parse_sitemap("https://example.com/sitemap.xml")) == []
+        assert mock_fetch_xml.call_count == 1
+
+    @patch("pipeline.sitemap.fetch_xml_bytes", return_value=URLSET_XML)
+    def test_results_streamed_lazily(self, mock_fetch_xml):
+        records = parse_sitemap("https://example.com/sitemap.xml")
+        assert mock_fetch_xml.call_count == 0
+        first = next(records)
+        assert first.loc == "https://docs.snowflake.com/en/page1"
+        records.close()
+
+    @patch("pipeline.sitemap.fetch_xml_bytes", return_value=URLSET_XML)
+    def test_progress_logged_not_printed(self, mock_fetch_xml, caplog, capsys):
+        with caplog.at_level("DEBUG", logger="pipeline.sitemap"):
+            list(parse_sitemap("https://example.com/sitemap.xml"))
+        assert "URL Set with 2 URL(s)" in caplog.text
+        assert capsys.readouterr().out == ""
+
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_repeated_entries_deduplicated_per_sitemap(self, mock_fetch_xml):
+        """Exact repeats collapse; the same loc in another sitemap is kept for SOURCES."""
+        doc = (
+            f'<urlset xmlns="{SITEMAP_NS_URI}">'
+            "<url><loc>https://docs.snowflake.com/en/a</loc></url>"
+            "<url><loc>https://docs.snowflake.com/en/a</loc></url>"
+            "<url><loc>https://docs.snowflake.com/en/a</loc><lastmod>2025-01-01</lastmod></url>"
+            "</urlset>"
+        ).encode()
+        payloads = {
+            "https://example.com/sitemap.xml": SITEMAP_INDEX_XML,
+            "https://docs.snowflake.com/sitemap-child1.xml": doc,
+            "https://docs.snowflake.com/sitemap-child2.xml": doc,
+        }
+        mock_fetch_xml.side_effect = payloads.get
+        results = list(parse_sitemap("https://example.com/sitemap.xml"))
+        assert len(results) == 4
+        assert {(r.source_sitemap, r.lastmod) for r in results} == {
+            ("https://docs.snowflake.com/sitemap-child1.xml", None),
+            ("https://docs.snowflake.com/sitemap-child1.xml", "2025-01-01"),
+            ("https://docs.snowflake.com/sitemap-child2.xml", None),
+            ("https://docs.snowflake.com/sitemap-child2.xml", "2025-01-01"),
+        }
+
+
+class TestIterUrls:
+    """pipeline.sitemap.iter_urls — streaming a single urlset."""
+
+    @patch("pipeline.sitemap.fetch_xml_bytes", return_value=URLSET_XML)
+    def test_yields_same_records_as_parse_sitemap(self, mock_fetch_xml):
+        url = "https://example.com/sitemap.xml"
+        assert list(iter_urls(url)) == list(parse_sitemap(url))
+
+    @patch("pipeline.sitemap.fetch_xml_bytes", return_value=SITEMAP_INDEX_XML)
+    def test_index_yields_nothing(self, mock_fetch_xml):
+        assert list(iter_urls("https://example.com/sitemap.xml")) == []
+
+    @patch("pipeline.sitemap.FETCH_CHUNK_SIZE", 16 * 1024)
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_iter_low_memory(self, mock_fetch_xml):
+        """Streaming 10k URLs peaks well below materialising them all."""
+        entries = "".join(
+            f"<url><loc>https://docs.snowflake.com/en/page-{i}</loc>"
+            "<lastmod>2025-01-01</lastmod></url>"
+            for i in range(10_000)
+        )
+        mock_fetch_xml.return_value = (
+            f'<urlset xmlns="{SITEMAP_NS_URI}">{entries}</urlset>'.encode("utf-8")
+        )
+        url = "https://example.com/sitemap.xml"
+
+        tracemalloc.start()
+        try:
+            count = sum(1 for _ in iter_urls(url))
+            _, streamed_peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            records = list(parse_sitemap(url))
+            _, materialised_peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert count == len(records) == 10_000
+        assert streamed_peak < materialised_peak / 3
+
+    @patch("pipeline.sitemap.fetch_xml_bytes")
+    def test_dedup_exact_at_scale(self, mock_fetch_xml):
+        """10k entries with 10% repeats: every unique URL survives, no repeat does."""
+        locs = [f"https://docs.snowflake.com/en/page-{i}" for i in range(9_000)]
+        locs += locs[::9]
+        entries = "".join(f"<url><loc>{loc}</loc></url>" for loc in locs)
+        mock_fetch_xml.return_value = (
+            f'<urlset xmlns="{SITEMAP_NS_URI}">{entries}</urlset>'.encode("utf-8")
+        )
+
+        results = [r.loc for r in iter_urls("https://example.com/sitemap.xml")]
+        assert len(locs) == 10_000
+        assert results == locs[:9_000]
+
+
+class TestSitemapTarget:
+    """pipeline.sitemap._SitemapTarget — element-free parser target."""
+
+    def test_chunked_feed_reassembles_text(self):
+        target = _SitemapTarget()
+        parser = ET.XMLParser(target=target)
+        for i in range(0, len(URLSET_XML), 7):
+            parser.feed(URLSET_XML[i:i + 7])
+        parser.close()
+        assert target.index is False
+        assert target.entries == [
+            ("https://docs.snowflake.com/en/page1", "2025-12-01"),
+            ("https://docs.snowflake.com/en/page2", None),
+        ]
+
+    def test_prefixed_namespace_matches_expanded_tags(self):
+        """Tags are compared in {uri}local form, so any namespace prefix works."""
+        doc = (
+            f'<sm:urlset xmlns:sm="{SITEMAP_NS_URI}">'
+            "<sm:url><sm:loc>https://docs.snowflake.com/en/a</sm:loc>"
+            "<sm:lastmod>2025-01-01</sm:lastmod></sm:url>"
+            "</sm:urlset>"
+        ).encode()
+        target = _SitemapTarget()
+        parser = ET.XMLParser(target=target)
+        parser.feed(doc)
+        parser.close()
+        assert target.entries == [("https://docs.snowflake.com/en/a", "2025-01-01")]
+
+    def test_index_entries_collected(self):
+        target = _SitemapTarget()
+        parser = ET.XMLParser(target=target)
+        parser.feed(SITEMAP_INDEX_XML)
+        parser.close()
+        assert target.index is True
+        assert [loc for loc, _ in target.entries] == [
+            "https://docs.snowflake.com/sitemap-child1.xml",
+            "https://docs.snowflake.com/sitemap-child2.xml",
+        ]
+
+
+class TestSitemapURL:
+    """pipeline.sitemap.SitemapURL — lightweight record row."""
+
+    @patch("pipeline.sitemap.fetch_xml_bytes", return_value=URLSET_XML)
+    def test_records_are_sitemap_urls(self, mock_fetch_xml):
+        first = next(parse_sitemap("https://example.com/sitemap.xml"))
+        assert first == SitemapURL(
+            "https://docs.snowflake.com/en/page1",
+            "2025-12-01",
+            "https://example.com/sitemap.xml",
+            "urlset",
+        )
+
+    def test_key_access_kept_for_existing_callers(self):
+        row = SitemapURL("https://docs.snowflake.com/en/a", None, "https://example.com/s.xml")
+        assert row["loc"] == row.loc == row[0]
+        assert row["sitemap_type"] == "urlset"
+        assert row._asdict()["source_sitemap"] == "https://example.com/s.xml"
+        with pytest.raises(KeyError):
+            row["missing"]
+
+    def test_non_field_keys_raise_key_error(self):
+        """Tuple/NamedTuple attributes are not record keys."""
+        row = SitemapURL("https://docs.snowflake.com/en/a", None, "https://example.com/s.xml")
+        for key in ("index", "count", "_fields", "_asdict", "__len__"):
+            with pytest.raises(KeyError):
+                row[key]
@@ -2,88 +2,281 @@
 Unit tests — Throttling / rate-limiting behavior (fetch_document).
 """
 
-from unittest.mock import MagicMock, patch
+import dataclasses
+import threading
+import time
+from unittest.mock import patch
 
+import pytest
 import requests
 
-from pipeline.ingest import fetch_document
-from pipeline.throttle import BACKOFF_BASE, MAX_RETRIES, THROTTLE_DELAY
+from pipeline.hashing import compute_hash
+from pipeline.ingest import _SESSION, fetch_document, fetch_many
+from pipeline.throttle import (
+    BACKOFF_BASE,
+    BACKOFF_CAP,
+    CONFIG,
+    FETCH_HEADERS,
+    MAX_CONTENT_SIZE,
+    MAX_RETRIES,
+    THROTTLE_DELAY,
+    TRANSIENT_STATUS_CODES,
+    compute_backoff,
+)
+from tests.conftest import make_response, mock_http_response
 
 
 class TestFetchDocumentThrottling:
     """pipeline.ingest.fetch_document — delay / backoff behavior."""
 
     @patch("pipeline.ingest.time.sleep")
-    @patch("pipeline.ingest.requests.get")
+    @patch("pipeline.ingest._SESSION.get")
     def test_success_includes_throttle_delay(self, mock_get, mock_sleep):
         """After a successful fetch, time.sleep(THROTTLE_DELAY) is called."""
-        ctx = MagicMock()
-        ctx.__enter__ = MagicMock(return_value=ctx)
-        ctx.__exit__ = MagicMock(return_value=False)
-        ctx.status_code = 200
-        ctx.iter_content = MagicMock(return_value=["<html>OK</html>"])
-        mock_get.return_value = ctx
+        mock_get.return_value = make_response(200, b"<html>OK</html>")
 
         result = fetch_document("https://example.com/page")
         assert result["fetch_status"] == "success"
         mock_sleep.assert_any_call(THROTTLE_DELAY)
 
     @patch("pipeline.ingest.time.sleep")
-    @patch("pipeline.ingest.requests.get")
-    def test_transient_error_triggers_backoff(self, mock_get, mock_sleep):
-        """A 503 on first attempt → backoff sleep before retry."""
-        ctx_fail = MagicMock()
-        ctx_fail.__enter__ = MagicMock(return_value=ctx_fail)
-        ctx_fail.__exit__ = MagicMock(return_value=False)
-        ctx_fail.status_code = 503
+    @patch("pipeline.ingest._SESSION.get")
+    def test_oversized_body_truncated(self, mock_get, mock_sleep):
+        """Bodies past MAX_CONTENT_SIZE are cut at a chunk boundary and marked."""
+        chunk = b"x" * (MAX_CONTENT_SIZE // 2)
+        mock_get.return_value = make_response(200, chunks=[chunk, chunk, chunk])
 
-        ctx_ok = MagicMock()
-        ctx_ok.__enter__ = MagicMock(return_value=ctx_ok)
-        ctx_ok.__exit__ = MagicMock(return_value=False)
-        ctx_ok.status_code = 200
-        ctx_ok.iter_content = MagicMock(return_value=["OK"])
+        result = fetch_document("https://example.com/huge")
+        assert result["fetch_status"] == "success"
+        assert result["content"].startswith("x" * len(chunk) * 2)
+        assert "[TRUNCATED at 5 MB]" in result["content"]
+        assert result["content_size_bytes"] == len(result["content"].encode("utf-8"))
 
-        mock_get.side_effect = [ctx_fail, ctx_ok]
+    @patch("pipeline.ingest.time.sleep")
+    @patch("pipeline.ingest._SESSION.get")
+    def test_transient_error_triggers_backoff(self, mock_get, mock_sleep):
+        """A 503 on first attempt → backoff sleep before retry."""
+        mock_get.side_effect = [make_response(503), make_response(200, b"OK")]
 
         result = fetch_document("https://example.com/page")
         assert result["fetch_status"] == "success"
         assert result["retry_count"] == 1
-        mock_sleep.assert_any_call(BACKOFF_BASE ** 1)
+        backoff = mock_sleep.call_args_list[0][0][0]
+        assert BACKOFF_BASE <= backoff <= BACKOFF_BASE * 3
+
+    @patch("pipeline.ingest.time.sleep")
+    @patch("pipeline.ingest._SESSION.get")
+    def test_every_attempt_acquires_host_token(self, mock_get, mock_sleep, ingest_limiter):
+        mock_get.side_effect = [mock_http_response(b"", 503), mock_http_response(b"OK")]
+        fetch_document("https://docs.snowflake.com/en/page")
+        assert ingest_limiter.acquire.call_count == 2
+        ingest_limiter.acquire.assert_called_with("docs.snowflake.com")
 
     @patch("pipeline.ingest.time.sleep")
-    @patch("pipeline.ingest.requests.get")
+    @patch("pipeline.ingest._SESSION.get")
     def test_all_retries_exhausted_returns_failed(self, mock_get, mock_sleep):
         """All attempts return transient 500 → failed with MAX_RETRIES."""
-        ctx = MagicMock()
-        ctx.__enter__ = MagicMock(return_value=ctx)
-        ctx.__exit__ = MagicMock(return_value=False)
-        ctx.status_code = 500
-
-        mock_get.return_value = ctx
+        mock_get.return_value = make_response(500)
 
         result = fetch_document("https://example.com/page")
         assert result["fetch_status"] == "failed"
         assert result["retry_count"] == MAX_RETRIES
 
     @patch("pipeline.ingest.time.sleep")
-    @patch("pipeline.ingest.requests.get", side_effect=requests.exceptions.Timeout("timed out"))
+    @patch("pipeline.ingest._SESSION.get", side_effect=requests.exceptions.Timeout("timed out"))
     def test_timeout_classified_correctly(self, mock_get, mock_sleep):
         result = fetch_document("https://example.com/slow")
         assert result["fetch_status"] == "timeout"
         assert result["content"] is None
 
     @patch("pipeline.ingest.time.sleep")
-    @patch("pipeline.ingest.requests.get")
+    @patch("pipeline.ingest._SESSION.get")
     def test_non_transient_error_no_retry(self, mock_get, mock_sleep):
         """404 is non-transient → single attempt, no retries."""
-        ctx = MagicMock()
-        ctx.__enter__ = MagicMock(return_value=ctx)
-        ctx.__exit__ = MagicMock(return_value=False)
-        ctx.status_code = 404
-
-        mock_get.return_value = ctx
+        mock_get.return_value = make_response(404)
 
         result = fetch_document("https://example.com/missing")
         assert result["fetch_status"] == "failed"
         assert result["retry_count"] == 0
         assert result["http_status"] == 404
+
+    @patch("pipeline.ingest.time.sleep")
+    @patch("pipeline.ingest._SESSION.get")
+    def test_rate_limited_429_is_retried(self, mock_get, mock_sleep):
+        mock_get.side_effect = [mock_http_response(b"", 429), mock_http_response(b"OK")]
+        result = fetch_document("https://example.com/busy")
+        assert result["fetch_status"] == "success"
+        assert result["retry_count"] == 1
+
+    def test_transient_codes_are_an_immutable_set(self):
+        assert isinstance(TRANSIENT_STATUS_CODES, frozenset)
+        assert {429, 500, 502, 503, 504} <= TRANSIENT_STATUS_CODES
+        assert 404 not in TRANSIENT_STATUS_CODES
+
+    @patch("pipeline.ingest.time.sleep")
+    @patch("pipeline.ingest._SESSION.get")
+    def test_text_chunks_accepted(self, mock_get, mock_sleep):
+        mock_get.return_value = make_response(200, chunks=["caf", "é page"])
+
+        result = fetch_document("https://example.com/text")
+        assert result["content"] == "café page"
+        assert result["content_hash"] == compute_hash("café page")
+        assert result["content_size_bytes"] == len("café page".encode("utf-8"))
+
+    @patch("pipeline.ingest.time.sleep")
+    @patch("pipeline.ingest._SESSION.get")
+    def test_declared_charset_used_for_decoding(self, mock_get, mock_sleep):
+        """Hash and size describe the stored text, not the raw latin-1 bytes."""
+        mock_get.return_value = make_response(200, b"caf\xe9 page", encoding="ISO-8859-1")
+
+        result = fetch_document("https://example.com/latin1")
+        assert result["content"] == "café page"
+        assert result["content_hash"] == compute_hash(result["content"])
+        assert result["content_size_bytes"] == len(result["content"].encode("utf-8"))
+
+    @patch("pipeline.ingest.time.sleep")
+    @patch("pipeline.ingest._SESSION.get")
+    def test_unknown_charset_falls_back_to_utf8(self, mock_get, mock_sleep):
+        mock_get.return_value = make_response(200, "café".encode("utf-8"), encoding="x-bogus")
+        assert fetch_document("https://example.com/odd")["content"] == "café"
+
+    @patch("pipeline.ingest.MAX_CONTENT_SIZE", 4)
+    @patch("pipeline.ingest.time.sleep")
+    @patch("pipeline.ingest._SESSION.get")
+    def test_truncation_drops_partial_character(self, mock_get, mock_sleep):
+        mock_get.return_value = make_response(200, chunks=[b"ab\xc3", b"\xa9cd"])
+
+        result = fetch_document("https://example.com/cut")
+        assert result["content"].startswith("ab\n\n[TRUNCATED")
+        assert "�" not in result["content"]
+        assert result["content_hash"] == compute_hash(result["content"])
+
+    @patch("pipeline.ingest.time.sleep")
+    @patch("pipeline.ingest._SESSION.get")
+    def test_cached_skips_sleep(self, mock_get, mock_sleep, ingest_limiter):
+        hit = {
+            "content": "OK", "content_hash": compute_hash("OK"), "content_size_bytes": 2,
+            "http_status": 200, "fetch_status": "success", "retry_count": 0, "from_cache": True,
+        }
+        with patch("pipeline.ingest._CACHE") as cache:
+            cache.get.return_value = hit
+            result = fetch_document("https://example.com/page")
+
+        assert result == hit
+        mock_get.assert_not_called()
+        mock_sleep.assert_not_called()
+        ingest_limiter.acquire.assert_not_called()
+
+    @patch("pipeline.ingest.time.sleep")
+    @patch("pipeline.ingest._SESSION.get")
+    def test_cache_miss_fetches_and_stores(self, mock_get, mock_sleep):
+        mock_get.return_value = make_response(200, b"fresh")
+        with patch("pipeline.ingest._CACHE") as cache:
+            cache.get.return_value = None
+            result = fetch_document("https://example.com/page")
+
+        assert result["fetch_status"] == "success"
+        cache.put.assert_called_once_with("https://example.com/page", result)
+
+
+class TestIngestSession:
+    """pipeline.ingest._SESSION — pooled keep-alive session."""
+
+    def test_transport_retries_disabled(self):
+        adapter = _SESSION.get_adapter("https://docs.snowflake.com/en/page")
+        assert adapter.max_retries.total == 0
+
+    def test_fetch_headers_set_on_session(self):
+        for name, value in FETCH_HEADERS.items():
+            assert _SESSION.headers[name] == value
+
+
+class TestFetchMany:
+    """pipeline.ingest.fetch_many — concurrent fan-out over fetch_document."""
+
+    @patch("pipeline.ingest.time.sleep")
+    @patch("pipeline.ingest._SESSION.get")
+    def test_returns_one_result_per_url(self, mock_get, mock_sleep):
+        def _response(url, **kwargs):
+            return make_response(404 if url.endswith("missing") else 200, url.encode("utf-8"))
+        mock_get.side_effect = _response
+
+        urls = [f"https://example.com/page{i}" for i in range(4)] + ["https://example.com/missing"]
+        results = list(fetch_many(urls + urls[:2], max_workers=3))
+        assert len(results) == len(urls)
+        assert mock_get.call_count == len(urls)
+
+        results = dict(results)
+        assert set(results) == set(urls)
+        assert results["https://example.com/page2"]["content"] == "https://example.com/page2"
+        assert results["https://example.com/missing"]["fetch_status"] == "failed"
+
+    @patch("pipeline.ingest.time.sleep")
+    @patch("pipeline.ingest._SESSION.get")
+    def test_url_stream_consumed_lazily(self, mock_get, mock_sleep):
+        mock_get.return_value = make_response(200, b"OK")
+
+        pulled = []
+
+        def _urls():
+            for i in range(10):
+                pulled.append(i)
+                yield f"https://example.com/page{i}"
+
+        results = fetch_many(_urls(), max_workers=2, max_in_flight=3)
+        next(results)
+        assert len(pulled) <= 4
+        assert len(list(results)) == 9
+
+    @patch("pipeline.ingest._SESSION.get")
+    def test_fetch_many_concurrent(self, mock_get):
+        """Network waits overlap across workers instead of adding up."""
+        latency = 0.05
+
+        def _slow_response(url, **kwargs):
+            threading.Event().wait(latency)   # real wait; time.sleep is patched below
+            return mock_http_response(b"body")
+
+        mock_get.side_effect = _slow_response
+        urls = [f"https://example.com/doc{i}" for i in range(16)]
+
+        with patch("pipeline.ingest.time.sleep"):
+            start = time.perf_counter()
+            results = dict(fetch_many(urls, max_workers=8))
+            elapsed = time.perf_counter() - start
+
+        assert len(results) == 16
+        assert all(r["fetch_status"] == "success" for r in results.values())
+        assert elapsed < len(urls) * latency / 2
+
+
+class TestThrottleConfig:
+    """pipeline.throttle.ThrottleConfig — immutable settings bundle."""
+
+    def test_module_constants_mirror_config(self):
+        assert MAX_RETRIES == CONFIG.max_retries
+        assert THROTTLE_DELAY == CONFIG.throttle_delay
+        assert TRANSIENT_STATUS_CODES is CONFIG.transient_status_codes
+
+    def test_config_is_frozen(self):
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            CONFIG.max_retries = 10
+
+
+class TestComputeBackoff:
+    """pipeline.throttle.compute_backoff — decorrelated jitter."""
+
+    def test_first_retry_within_base_window(self):
+        for _ in range(200):
+            assert BACKOFF_BASE <= compute_backoff() <= BACKOFF_BASE * 3
+
+    def test_window_grows_with_previous_delay(self):
+        delays = [compute_backoff(10) for _ in range(200)]
+        assert all(BACKOFF_BASE <= d <= 30 for d in delays)
+        assert max(delays) > BACKOFF_BASE * 3
+
+    def test_capped(self):
+        assert all(compute_backoff(BACKOFF_CAP * 10) <= BACKOFF_CAP for _ in range(200))
+
+    def test_jittered(self):
+        assert len({compute_backoff() for _ in range(20)}) > 1